@@ -0,0 +1,277 @@
+import heapq
+import numpy
+
+
+class ChainAnalytics:
+    '''Put/call ratio, max pain, open interest buildup and implied volatility skew of an option chain
+
+    The payload is read into columns once, sorted by expiry and strike, so every expiry is a
+    contiguous slice and all the figures of an expiry come out of the same few array operations.
+    '''
+
+    fields = ('openInterest', 'changeinOpenInterest', 'totalTradedVolume', 'impliedVolatility', 'lastPrice', 'change')
+    '''leg fields read from the payload, missing legs read as 0 except impliedVolatility which reads as nan'''
+
+    buildup = {
+        (True, True): 'long buildup',
+        (True, False): 'short buildup',
+        (False, True): 'short covering',
+        (False, False): 'long unwinding',
+    }
+    '''reading of (open interest added, price up)'''
+
+    def __init__(self, state):
+        """builds the columns of an option chain payload
+
+        Args:
+            state (object): option chain payload as returned by index_option_chain
+        """
+        records = state['records']
+        rows = records['data']
+        self.underlying_value = records['underlyingValue']
+        self.timestamp = records.get('timestamp')
+        self.expiry_dates = list(records['expiryDates'])
+        position = {expiry: i for i, expiry in enumerate(self.expiry_dates)}
+        size = len(rows)
+        expiry = numpy.empty(size, dtype=numpy.int64)
+        strike = numpy.empty(size)
+        columns = {leg: {field: numpy.full(size, numpy.nan if field == 'impliedVolatility' else 0.0)
+                         for field in self.fields} for leg in ('CE', 'PE')}
+        for i, row in enumerate(rows):
+            expiry[i] = position.setdefault(row['expiryDate'], len(position))
+            strike[i] = row['strikePrice']
+            for leg in ('CE', 'PE'):
+                quote = row.get(leg)
+                if quote:
+                    for field in self.fields:
+                        value = quote.get(field)
+                        if value is not None:
+                            columns[leg][field][i] = value
+        if len(position) > len(self.expiry_dates):
+            self.expiry_dates = list(position)
+        order = numpy.lexsort((strike, expiry))
+        self.expiry = expiry[order]
+        self.strike = strike[order]
+        self.columns = {leg: {field: values[order] for field, values in leg_columns.items()}
+                        for leg, leg_columns in columns.items()}
+        bounds = numpy.searchsorted(self.expiry, numpy.arange(len(self.expiry_dates) + 1))
+        self.slices = {expiry: slice(bounds[i], bounds[i + 1]) for i, expiry in enumerate(self.expiry_dates)}
+
+    @staticmethod
+    def ratio(numerator: float, denominator: float, decimals: int = 4):
+        """returns numerator / denominator rounded, None when the denominator is 0"""
+        return round(float(numerator) / float(denominator), decimals) if denominator else None
+
+    @staticmethod
+    def max_pain(strike, call_oi, put_oi):
+        """returns the settlement strike at which option writers pay the least, and the payout at every strike
+
+        The payout of calls at strike k is sum(call_oi[i] * (k - strike[i])) over strikes below k, which is
+        k * cumsum(call_oi) - cumsum(call_oi * strike); the puts are the same with suffix sums, so the
+        whole curve takes linear time instead of pricing every strike against every other.
+
+        Args:
+            strike (numpy.ndarray): sorted strikes
+            call_oi (numpy.ndarray): call open interest per strike
+            put_oi (numpy.ndarray): put open interest per strike
+
+        Returns:
+            tuple: max pain strike (None without strikes) and the payout per strike
+        """
+        if len(strike) == 0:
+            return None, numpy.empty(0)
+        call_paid = strike * numpy.cumsum(call_oi) - numpy.cumsum(call_oi * strike)
+        put_paid = numpy.cumsum((put_oi * strike)[::-1])[::-1] - strike * numpy.cumsum(put_oi[::-1])[::-1]
+        payout = call_paid + put_paid
+        return float(strike[numpy.argmin(payout)]), payout
+
+    def leaders(self, part: slice, leg: str, top: int):
+        """returns the strikes of a leg with the largest open interest addition and unwinding
+
+        Args:
+            part (slice): rows of one expiry
+            leg (str): CE or PE
+            top (int): strikes per list
+
+        Returns:
+            dict: added and unwound lists of strikePrice, changeinOpenInterest, openInterest and buildup
+        """
+        columns = self.columns[leg]
+        change = columns['changeinOpenInterest'][part]
+        count = min(top, len(change))
+        if count == 0:
+            return {'added': [], 'unwound': []}
+        added = numpy.argpartition(-change, count - 1)[:count]
+        unwound = numpy.argpartition(change, count - 1)[:count]
+        result = {}
+        for name, picked, sign in (('added', added, -1), ('unwound', unwound, 1)):
+            picked = picked[numpy.argsort(sign * change[picked], kind='stable')]
+            result[name] = [{
+                'strikePrice': float(self.strike[part][i]),
+                'changeinOpenInterest': float(change[i]),
+                'openInterest': float(columns['openInterest'][part][i]),
+                'buildup': self.buildup[(bool(change[i] > 0), bool(columns['change'][part][i] > 0))],
+            } for i in picked if sign * change[i] < 0]
+        return result
+
+    def skew(self, part: slice):
+        """returns the strike-wise implied volatility skew of one expiry
+
+        Args:
+            part (slice): rows of one expiry
+
+        Returns:
+            dict: at the money strike and implied volatility, and per strike the CE and PE implied
+                volatility, put minus call and the mean of both legs minus the at the money value
+        """
+        strike = self.strike[part]
+        call_iv = self.columns['CE']['impliedVolatility'][part]
+        put_iv = self.columns['PE']['impliedVolatility'][part]
+        # NSE reports 0 for legs that did not trade
+        call_iv = numpy.where(call_iv > 0, call_iv, numpy.nan)
+        put_iv = numpy.where(put_iv > 0, put_iv, numpy.nan)
+        quoted = ~numpy.isnan(call_iv) * 1 + ~numpy.isnan(put_iv) * 1
+        total = numpy.nan_to_num(call_iv) + numpy.nan_to_num(put_iv)
+        mean_iv = numpy.where(quoted > 0, total / numpy.maximum(quoted, 1), numpy.nan)
+        atm_iv = None
+        atm_strike = None
+        if len(strike):
+            atm = int(numpy.argmin(numpy.abs(strike - self.underlying_value)))
+            atm_strike = float(strike[atm])
+            atm_iv = None if numpy.isnan(mean_iv[atm]) else round(float(mean_iv[atm]), 2)
+        relative = mean_iv - atm_iv if atm_iv is not None else numpy.full(len(strike), numpy.nan)
+        return {
+            'atmStrike': atm_strike,
+            'atmIV': atm_iv,
+            'strikePrice': strike.tolist(),
+            'CE': self.listed(call_iv),
+            'PE': self.listed(put_iv),
+            'putMinusCall': self.listed(put_iv - call_iv),
+            'relativeToATM': self.listed(relative),
+        }
+
+    @staticmethod
+    def listed(values, decimals: int = 2):
+        """returns an array as a json friendly list, nan as None"""
+        return [None if numpy.isnan(value) else value for value in numpy.round(values, decimals).tolist()]
+
+    def expiry_analytics(self, expiry: str, top: int = 5):
+        """returns the analytics of one expiry
+
+        Args:
+            expiry (str): expiry date as given by NSE
+            top (int, optional): strikes per open interest change list. Defaults to 5.
+
+        Returns:
+            dict: pcr by open interest and volume, max pain, open interest totals, change leaders and skew
+        """
+        part = self.slices.get(expiry, slice(0, 0))
+        call, put = self.columns['CE'], self.columns['PE']
+        strike = self.strike[part]
+        call_oi, put_oi = call['openInterest'][part], put['openInterest'][part]
+        pain_strike, _ = self.max_pain(strike, call_oi, put_oi)
+        return {
+            'pcrOI': self.ratio(put_oi.sum(), call_oi.sum()),
+            'pcrVolume': self.ratio(put['totalTradedVolume'][part].sum(), call['totalTradedVolume'][part].sum()),
+            'maxPain': pain_strike,
+            'callOI': float(call_oi.sum()),
+            'putOI': float(put_oi.sum()),
+            'callChangeOI': float(call['changeinOpenInterest'][part].sum()),
+            'putChangeOI': float(put['changeinOpenInterest'][part].sum()),
+            'maxCallOIStrike': float(strike[numpy.argmax(call_oi)]) if len(strike) else None,
+            'maxPutOIStrike': float(strike[numpy.argmax(put_oi)]) if len(strike) else None,
+            'leaders': {leg: self.leaders(part, leg, top) for leg in ('CE', 'PE')},
+            'skew': self.skew(part),
+        }
+
+    def analyse(self, expiries: list = None, top: int = 5):
+        """returns the analytics of the whole chain and of each expiry
+
+        Args:
+            expiries (list, optional): expiry dates to analyse. Defaults to every expiry.
+            top (int, optional): strikes per open interest change list. Defaults to 5.
+
+        Returns:
+            dict: underlyingValue, timestamp, overall pcr by open interest and volume, and per expiry analytics
+        """
+        call, put = self.columns['CE'], self.columns['PE']
+        expiries = self.expiry_dates if expiries is None else expiries
+        return {
+            'underlyingValue': self.underlying_value,
+            'timestamp': self.timestamp,
+            'pcrOI': self.ratio(put['openInterest'].sum(), call['openInterest'].sum()),
+            'pcrVolume': self.ratio(put['totalTradedVolume'].sum(), call['totalTradedVolume'].sum()),
+            'expiries': {expiry: self.expiry_analytics(expiry, top) for expiry in expiries},
+        }
+
+
+class TopOptions:
+    '''Top calls and puts of an option chain by several metrics, across every expiry
+
+    Each metric and leg keeps a min-heap bounded to the requested size, so one walk over the rows
+    ranks every metric at O(rows * log(top)) instead of sorting the whole chain once per metric.
+    '''
+
+    metrics = {
+        'openInterest': lambda quote: quote.get('openInterest'),
+        'changeinOpenInterest': lambda quote: quote.get('changeinOpenInterest'),
+        'totalTradedVolume': lambda quote: quote.get('totalTradedVolume'),
+        'impliedVolatility': lambda quote: quote.get('impliedVolatility'),
+        'turnover': lambda quote: quote.get('lastPrice', 0) * quote.get('totalTradedVolume', 0),
+    }
+    '''metric name and how it is read from a leg, turnover is premium times contracts traded'''
+
+    fields = ('strikePrice', 'expiryDate', 'identifier', 'lastPrice', 'openInterest', 'changeinOpenInterest',
+              'totalTradedVolume', 'impliedVolatility')
+    '''leg fields copied to the result'''
+
+    def __init__(self, metrics: list = None, top: int = 5):
+        """sets what is ranked
+
+        Args:
+            metrics (list, optional): names from metrics. Defaults to every metric.
+            top (int, optional): options kept per metric and leg. Defaults to 5.
+        """
+        metrics = list(self.metrics) if metrics is None else list(metrics)
+        unknown = [name for name in metrics if name not in self.metrics]
+        if unknown:
+            raise ValueError(f'unknown metric {", ".join(unknown)}, use one of {", ".join(self.metrics)}')
+        self.names = metrics
+        self.top = top
+
+    def rank(self, state):
+        """returns the top options of each metric and leg of an option chain payload
+
+        Args:
+            state (object): option chain payload as returned by index_option_chain, or its list of rows
+
+        Returns:
+            dict: per metric, CE and PE lists of the top options, largest first, earlier rows first on ties
+        """
+        rows = state['records']['data'] if isinstance(state, dict) else state
+        top = self.top
+        heaps = {(name, leg): [] for name in self.names for leg in ('CE', 'PE')}
+        readers = [(name, self.metrics[name]) for name in self.names]
+        for order, row in enumerate(rows if top > 0 else ()):
+            for leg in ('CE', 'PE'):
+                quote = row.get(leg)
+                if not quote:
+                    continue
+                for name, read in readers:
+                    value = read(quote)
+                    if value is None:
+                        continue
+                    heap = heaps[(name, leg)]
+                    # -order is unique and makes the earlier row the larger entry, so it survives ties
+                    if len(heap) < top:
+                        heapq.heappush(heap, (value, -order, quote))
+                    elif (value, -order) > heap[0][:2]:
+                        heapq.heapreplace(heap, (value, -order, quote))
+        result = {}
+        for name in self.names:
+            result[name] = {}
+            for leg in ('CE', 'PE'):
+                ranked = sorted(heaps[(name, leg)], key=lambda entry: entry[:2], reverse=True)
+                result[name][leg] = [dict({field: quote.get(field) for field in self.fields}, value=value)
+                                     for value, _, quote in ranked]
+        return result
@@ -0,0 +1,523 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+import numpy
+import nbnchain
+import nbndetails
+import nbngreeks
+import nbnclient
+import nbnmain
+import nbnreplay
+import nbnstore
+import nbntable
+import nbntransport
+
+
+class StaticClient:
+    '''Stand-in for the NSE client that always answers with the same payloads'''
+
+    def __init__(self, chain, live_index=None):
+        self.chain = chain
+        self.raw = None
+        self.index = live_index or {'data': [{'open': 17400.0, 'dayHigh': 17620.5, 'dayLow': 17380.25, 'lastPrice': 17500.0}]}
+
+    def index_option_chain(self, symbol=None):
+        return self.chain
+
+    def index_option_chain_raw(self, symbol=None):
+        if self.raw is None:
+            self.raw = json.dumps(self.chain).encode('utf8')
+        return self.raw
+
+    def live_index(self, symbol=None):
+        return self.index
+
+
+class NBNBench:
+    '''Benchmarks for the numeric paths of nifty/banknifty'''
+
+    roi = 0.07
+    '''rate of interest used for the synthetic chain'''
+
+    payloads = {
+        'small': (20, 3),
+        'typical': (80, 12),
+        'worst': (200, 18),
+    }
+    '''strikes and expiries of the generated option chain payloads'''
+
+    payload_time = datetime(2022, 10, 17, 11, 0)
+    '''time the generated payloads are built for, fixed so runs are comparable'''
+
+    payload_path = 'assets/bench'
+    '''folder of recorded payloads, a <name>.json there replaces the generated payload of that name'''
+
+    min_time = 0.2
+    '''seconds each case is repeated for'''
+
+    threshold = 0.2
+    '''relative drop in ops/sec reported as a regression'''
+
+    memory_threshold = 0.2
+    '''relative growth in peak KB reported as a regression'''
+
+    def synthetic_chain(self, strikes: int = 100, expiries: int = 12, spot: float = 17500.0, step: float = 50.0,
+                        seed: int = 1, now: datetime = None):
+        """builds an option chain payload shaped like the NSE index_option_chain response
+
+        Prices are generated from a volatility smile with the black scholes model, so the
+        implied volatility of each row is known.
+
+        Args:
+            strikes (int, optional): strikes per expiry. Defaults to 100.
+            expiries (int, optional): weekly expiries. Defaults to 12.
+            spot (float, optional): underlying value. Defaults to 17500.0.
+            step (float, optional): strike interval. Defaults to 50.0.
+            seed (int, optional): random seed for open interest and volume. Defaults to 1.
+            now (datetime, optional): time the chain is generated for. Defaults to current time.
+
+        Returns:
+            object: option chain payload
+        """
+        now = now or datetime.now()
+        rng = numpy.random.default_rng(seed)
+        greeks = nbngreeks.NBNGreeks()
+        first = now + timedelta((3 - now.weekday()) % 7 or 7)
+        expiry_dates = [(first + timedelta(weeks=week)).strftime('%d-%b-%Y') for week in range(expiries)]
+        atm = round(spot / step) * step
+        strike_prices = [atm + step * (i - strikes // 2) for i in range(strikes)]
+        data = []
+        for expiry, time_left in zip(expiry_dates, greeks.time_to_expiry(expiry_dates, now)):
+            strike = numpy.asarray(strike_prices)
+            moneyness = numpy.log(strike / spot)
+            sigma = 0.14 + 0.6 * moneyness * moneyness - 0.1 * moneyness
+            call, put = greeks.chain_price(spot, strike, time_left, self.roi, sigma)
+            open_interest = rng.integers(0, 200000, (2, strikes))
+            volume = rng.integers(0, 5000000, (2, strikes))
+            for i, price in enumerate(strike_prices):
+                row = {'strikePrice': price, 'expiryDate': expiry}
+                for leg, ltp, col in (('CE', call[i], 0), ('PE', put[i], 1)):
+                    row[leg] = {
+                        'strikePrice': price,
+                        'expiryDate': expiry,
+                        'underlying': 'NIFTY',
+                        'identifier': f'OPTIDXNIFTY{expiry}{leg}{price:.2f}',
+                        'openInterest': int(open_interest[col, i]),
+                        'changeinOpenInterest': int(rng.integers(-20000, 20000)),
+                        'pchangeinOpenInterest': round(float(rng.normal(0, 20)), 2),
+                        'totalTradedVolume': int(volume[col, i]),
+                        'impliedVolatility': round(float(sigma[i]) * 100, 2),
+                        'lastPrice': round(float(ltp), 2),
+                        'change': round(float(rng.normal(0, 10)), 2),
+                        'pChange': round(float(rng.normal(0, 5)), 2),
+                        'totalBuyQuantity': int(rng.integers(0, 500000)),
+                        'totalSellQuantity': int(rng.integers(0, 500000)),
+                        'bidQty': 50,
+                        'bidprice': round(float(ltp) - 0.05, 2),
+                        'askQty': 50,
+                        'askPrice': round(float(ltp) + 0.05, 2),
+                        'underlyingValue': spot,
+                    }
+                data.append(row)
+        nearest = [row for row in data if row['expiryDate'] == expiry_dates[0]]
+        return {
+            'records': {
+                'expiryDates': expiry_dates,
+                'data': data,
+                'timestamp': now.strftime('%d-%b-%Y %H:%M:%S'),
+                'underlyingValue': spot,
+                'strikePrices': strike_prices,
+            },
+            'filtered': {
+                'data': nearest,
+                'CE': {'totOI': sum(row['CE']['openInterest'] for row in nearest),
+                       'totVol': sum(row['CE']['totalTradedVolume'] for row in nearest)},
+                'PE': {'totOI': sum(row['PE']['openInterest'] for row in nearest),
+                       'totVol': sum(row['PE']['totalTradedVolume'] for row in nearest)},
+            },
+        }
+
+    def timeit(self, func, repeat: int = 5):
+        """returns the best wall clock time of a call in seconds
+
+        Args:
+            func (callable): function without arguments
+            repeat (int, optional): number of runs. Defaults to 5.
+
+        Returns:
+            float: best time in seconds
+        """
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def bench_implied_volatility(self, strikes: int = 100, expiries: int = 12):
+        """times the batch implied volatility solve of a full synthetic chain
+
+        Args:
+            strikes (int, optional): strikes per expiry. Defaults to 100.
+            expiries (int, optional): weekly expiries. Defaults to 12.
+
+        Returns:
+            object: contracts solved, seconds taken and median IV error in volatility points
+        """
+        now = datetime.now()
+        chain = self.synthetic_chain(strikes, expiries, now=now)
+        greeks = nbngreeks.NBNGreeks()
+        seconds = self.timeit(lambda: greeks.chain_implied_volatility(chain, self.roi, now))
+        result = greeks.chain_implied_volatility(chain, self.roi, now)
+        expected = numpy.asarray([row['CE']['impliedVolatility'] for row in chain['records']['data']]) / 100
+        # prices are rounded to the tick, so far wings and expiring rows are only roughly recoverable
+        error = numpy.nanmedian(numpy.abs(numpy.concatenate((result['CE'], result['PE'])) - numpy.tile(expected, 2))) * 100
+        return {
+            'contracts': 2 * len(chain['records']['data']),
+            'seconds': seconds,
+            'solved': int(numpy.isfinite(result['CE']).sum() + numpy.isfinite(result['PE']).sum()),
+            'medianErrorPoints': round(float(error), 4),
+        }
+
+    def bench_greeks_cache(self, ticks: int = 20, strikes: int = 100, expiries: int = 12, moved: float = 0.05, seed: int = 1,
+                           spot_move: float = 2.0):
+        """times incremental greeks against a full recompute over polls where a share of the legs and the underlying move
+
+        Args:
+            ticks (int, optional): polls after the first snapshot. Defaults to 20.
+            strikes (int, optional): strikes per expiry. Defaults to 100.
+            expiries (int, optional): weekly expiries. Defaults to 12.
+            moved (float, optional): share of rows whose implied volatility changes on each poll. Defaults to 0.05.
+            seed (int, optional): random seed of the moves. Defaults to 1.
+            spot_move (float, optional): standard deviation in points of the underlying move between polls. Defaults to 2.0.
+
+        Returns:
+            object: seconds per poll of both paths, added, reused, refreshed and recomputed legs, and the largest difference
+        """
+        rng = numpy.random.default_rng(seed)
+        now = self.payload_time
+        chain = self.synthetic_chain(strikes, expiries, now=now)
+        rows = chain['records']['data']
+        greeks = nbngreeks.NBNGreeks()
+        cache = nbngreeks.GreeksCache(self.roi, greeks=greeks)
+        cache.update(chain, 'NIFTY', now)
+        incremental = full = difference = 0.0
+        for tick in range(1, ticks + 1):
+            now = self.payload_time + timedelta(seconds=3 * tick)
+            chain['records']['underlyingValue'] = round(chain['records']['underlyingValue'] + rng.normal(0, spot_move), 2)
+            for i in rng.choice(len(rows), int(len(rows) * moved), replace=False):
+                rows[i]['CE']['impliedVolatility'] = round(rows[i]['CE']['impliedVolatility'] + rng.normal(0, 0.2), 2)
+            started = time.perf_counter()
+            result = cache.update(chain, 'NIFTY', now)
+            incremental += time.perf_counter() - started
+            started = time.perf_counter()
+            expected = greeks.option_chain_greeks(chain, self.roi, now)
+            full += time.perf_counter() - started
+            for leg in ('CE', 'PE'):
+                for name in cache.names:
+                    difference = max(difference, float(numpy.nanmax(numpy.abs(result[leg][name] - expected[leg][name]))))
+        return {
+            'legs': 2 * len(rows),
+            'incrementalSeconds': incremental / ticks,
+            'fullSeconds': full / ticks,
+            'stats': dict(cache.stats),
+            'maxDifference': round(difference, 6),
+        }
+
+    def payload(self, name: str):
+        """returns the recorded payload of a name when there is one, else the generated one
+
+        Args:
+            name (str): small, typical, worst or the name of a recorded payload
+
+        Returns:
+            object: option chain payload
+        """
+        path = os.path.join(self.payload_path, name + '.json')
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf8') as file:
+                return json.load(file)
+        strikes, expiries = self.payloads[name]
+        return self.synthetic_chain(strikes, expiries, now=self.payload_time)
+
+    def record(self, name: str = 'recorded'):
+        """fetches the live option chain from NSE and saves it as a recorded payload
+
+        Args:
+            name (str, optional): name of the payload. Defaults to 'recorded'.
+
+        Returns:
+            str: path of the saved payload
+        """
+        state = nbnmain.NiftyBankNifty().fetch('index_option_chain')
+        os.makedirs(self.payload_path, exist_ok=True)
+        path = os.path.join(self.payload_path, name + '.json')
+        with open(path, 'w', encoding='utf8') as file:
+            json.dump(state, file)
+        return path
+
+    def measure(self, func):
+        """returns the ops/sec of a call repeated for min_time and the peak memory of one call
+
+        Args:
+            func (callable): function without arguments
+
+        Returns:
+            object: opsPerSec and peakKB
+        """
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        count = 0
+        start = time.perf_counter()
+        elapsed = 0
+        while elapsed < self.min_time:
+            func()
+            count += 1
+            elapsed = time.perf_counter() - start
+        return {'opsPerSec': round(count / elapsed, 2), 'peakKB': round(peak / 1024, 1)}
+
+    def cases(self, name: str, state):
+        """returns the benchmark cases of one payload as name to function
+
+        Args:
+            name (str): payload name, used as prefix of the case names
+            state (object): option chain payload
+
+        Returns:
+            dict: functions without arguments
+        """
+        greeks = nbngreeks.NBNGreeks()
+        details = nbndetails.NBNDetails()
+        rows = state['records']['data']
+        strike = numpy.asarray([row['strikePrice'] for row in rows], dtype=numpy.float64)
+        expiry_time = numpy.maximum(greeks.time_to_expiry([row['expiryDate'] for row in rows], self.payload_time), 1 / 365)
+        sigma = numpy.asarray([row['CE']['impliedVolatility'] for row in rows]) / 100
+        spot = state['records']['underlyingValue']
+        contracts = list(zip(strike.tolist(), expiry_time.tolist(), sigma.tolist()))
+
+        def scalar_greeks():
+            for strike_price, time_left, iv in contracts:
+                for method in (greeks.call_delta, greeks.put_delta, greeks.call_theta, greeks.put_theta,
+                               greeks.call_put_gamma, greeks.call_put_vega, greeks.call_rho, greeks.put_rho):
+                    method(spot, strike_price, time_left, self.roi, iv)
+
+        nbn = nbnmain.NiftyBankNifty(client=StaticClient(state))
+        nbn.output_format = 'none'
+        bars = len(rows)
+        ohlc = numpy.random.default_rng(1).uniform(17000, 18000, (4, bars))
+        output_folder = tempfile.mkdtemp(prefix='nbnbench')
+
+        def json_output():
+            nbn.output_format = 'json'
+            nbn.get_jsonfile_path()
+            nbn.output_data(state)
+            nbn.output_format = 'none'
+
+        store = nbnstore.SegmentStore(output_folder)
+        cases = {
+            'greeks.scalar': scalar_greeks,
+            'greeks.chain': lambda: greeks.chain_greeks(spot, strike, expiry_time, self.roi, sigma),
+            'greeks.impliedVolatility': lambda: greeks.chain_implied_volatility(state, self.roi, self.payload_time),
+            'pivot.scalar': lambda: details.get_pivot({'o': 17400.0, 'h': 17620.5, 'l': 17380.25, 'c': 17500.0}),
+            'pivot.array': lambda: details.get_pivot_array(ohlc[0], numpy.maximum(ohlc[1], ohlc[0]), numpy.minimum(ohlc[2], ohlc[0]), ohlc[3]),
+            'optChain.index': lambda: nbnchain.OptionChain(state),
+            'optChain.table': lambda: nbntable.ChainTable.from_payload(state),
+            'output.json': json_output,
+            'output.ndjson': lambda: store.append('bench', state),
+        }
+        for limit in (5, 10, 50):
+            cases[f'optChain.limit{limit}'] = lambda limit=limit: nbn.opt_chain(limit)
+        return {f'{name}.{case}': func for case, func in cases.items()}
+
+    def run(self, names: list = None):
+        """runs every case on every payload
+
+        Args:
+            names (list, optional): payload names. Defaults to the generated payloads plus any recorded ones.
+
+        Returns:
+            dict: opsPerSec and peakKB per case
+        """
+        if names is None:
+            names = list(self.payloads)
+            if os.path.isdir(self.payload_path):
+                names += sorted(file[:-len('.json')] for file in os.listdir(self.payload_path)
+                                if file.endswith('.json') and file[:-len('.json')] not in self.payloads)
+        cwd = os.getcwd()
+        results = {}
+        with tempfile.TemporaryDirectory(prefix='nbnbench') as folder:
+            for name in names:
+                state = self.payload(name)
+                cases = self.cases(name, state)
+                # json output goes to output/ of the current folder, keep it out of the repo
+                os.chdir(folder)
+                try:
+                    for case, func in cases.items():
+                        results[case] = self.measure(func)
+                finally:
+                    os.chdir(cwd)
+        return results
+
+    def bench_transport(self, cassette_path: str, latency: float = 0.05, jitter: float = 0.0, error_rate: float = 0.0,
+                        rounds: int = 5):
+        """times the snapshot endpoints fetched serially, concurrently and through the cache against a replayed cassette
+
+        Args:
+            cassette_path (str): folder recorded with --record=folder
+            latency (float, optional): seconds injected per request. Defaults to 0.05.
+            jitter (float, optional): random seconds added or removed per request. Defaults to 0.0.
+            error_rate (float, optional): share of requests answered with an error. Defaults to 0.0.
+            rounds (int, optional): snapshots taken per mode. Defaults to 5.
+
+        Returns:
+            dict: seconds per snapshot and failed sections per mode
+        """
+        results = {}
+        for mode in ('serial', 'concurrent', 'cached'):
+            faults = nbntransport.Faults(latency, jitter, error_rate, seed=1)
+            client = nbnclient.NBNClient(adapter=nbntransport.ReplayAdapter(nbntransport.Cassette(cassette_path), faults))
+            cache = None if mode == 'cached' else nbnreplay.ReplayCache()
+            nbn = nbnmain.NiftyBankNifty(client=client, cache=cache)
+            nbn.output_format = 'none'
+            failed = 0
+            start = time.perf_counter()
+            for _ in range(rounds):
+                if mode == 'serial':
+                    for endpoint in nbn.snapshot_endpoints.values():
+                        try:
+                            nbn.fetch(endpoint)
+                        except Exception:
+                            failed += 1
+                else:
+                    failed += len(nbn.snapshot()['errors'])
+            elapsed = time.perf_counter() - start
+            results[mode] = {'secondsPerSnapshot': round(elapsed / rounds, 4), 'failedSections': failed}
+        return results
+
+    def bench_startup(self, cassette_path: str = None, repeat: int = 5):
+        """times a fresh interpreter from launch to the first byte of output for short CLI commands
+
+        The 'eager imports' row loads numpy, scipy.stats and jugaad_data up front the way the
+        modules used to, as the reference the other commands are compared with.
+
+        Args:
+            cassette_path (str, optional): folder recorded with --record=folder, adds fetch commands replayed from it. Defaults to None.
+            repeat (int, optional): launches per command, the best is kept. Defaults to 5.
+
+        Returns:
+            dict: best seconds to first output per command
+        """
+        run = 'import sys, nbnmain; sys.argv = ["nbn"] + sys.argv[1:]; nbnmain.NiftyBankNifty().big_main()'
+        commands = {
+            '-h': [sys.executable, '-c', run, '-h'],
+            '--help': [sys.executable, '-c', run, '--help'],
+            'eager imports -h': [sys.executable, '-c', 'import numpy, scipy.stats, jugaad_data.nse; ' + run, '-h'],
+        }
+        if cassette_path is not None:
+            for command in ('-getNiftyOverview', '-allIndices', '-supportAndResistence'):
+                commands[command] = [sys.executable, '-c', run, command, f'--replay={cassette_path}']
+        results = {}
+        for name, command in commands.items():
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+                process.stdout.read(1)
+                elapsed = time.perf_counter() - start
+                process.stdout.read()
+                process.wait()
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = round(best, 4)
+        return results
+
+    def save(self, results: dict, path: str = 'bench_baseline.json'):
+        """writes the output of run as the baseline compare reads
+
+        Args:
+            results (dict): output of run
+            path (str, optional): baseline file. Defaults to 'bench_baseline.json'.
+
+        Returns:
+            str: path of the baseline
+        """
+        with open(path, 'w', encoding='utf8') as file:
+            json.dump(results, file, indent=2)
+            file.write('\n')
+        return path
+
+    def load(self, path: str = 'bench_baseline.json'):
+        """returns a baseline written by save"""
+        with open(path, 'r', encoding='utf8') as file:
+            return json.load(file)
+
+    def compare(self, results: dict, baseline: dict):
+        """returns the cases whose ops/sec dropped by more than threshold or whose peak KB grew by more than
+        memory_threshold against the baseline
+
+        Args:
+            results (dict): output of run
+            baseline (dict): earlier output of run
+
+        Returns:
+            dict: per regressed case, the baseline and current value and the relative change of each regressed
+            metric, opsPerSec or peakKB
+        """
+        regressions = {}
+        for case, result in results.items():
+            if case not in baseline:
+                continue
+            for metric, sign, limit in (('opsPerSec', -1, self.threshold), ('peakKB', 1, self.memory_threshold)):
+                before = baseline[case][metric]
+                change = (result[metric] - before) / before if before else 0
+                if sign * change > limit:
+                    regressions.setdefault(case, {})[metric] = {'baseline': before, 'current': result[metric],
+                                                                'change': round(change, 3)}
+        return regressions
+
+if __name__ == '__main__':
+    bench = NBNBench()
+    args = sys.argv[1:]
+    baseline_path = next((arg[len('--baseline='):] for arg in args if arg.startswith('--baseline=')), 'bench_baseline.json')
+    threshold = next((arg[len('--threshold='):] for arg in args if arg.startswith('--threshold=')), None)
+    if threshold is not None:
+        bench.threshold = float(threshold)
+    memory_threshold = next((arg[len('--memoryThreshold='):] for arg in args if arg.startswith('--memoryThreshold=')), None)
+    if memory_threshold is not None:
+        bench.memory_threshold = float(memory_threshold)
+    mode = args[0] if args else None
+    if mode == '-impliedVolatility':
+        print(bench.bench_implied_volatility())
+    elif mode == '-greeksCache':
+        print(bench.bench_greeks_cache())
+    elif mode == '-record':
+        print(bench.record())
+    elif mode == '-startup':
+        cassette = next((arg[len('--cassette='):] for arg in args if arg.startswith('--cassette=')), None)
+        print(bench.bench_startup(cassette))
+    elif mode == '-transport':
+        cassette = next((arg[len('--cassette='):] for arg in args if arg.startswith('--cassette=')), 'cassette')
+        latency = next((float(arg[len('--latency='):]) for arg in args if arg.startswith('--latency=')), 0.05)
+        print(bench.bench_transport(cassette, latency))
+    elif mode in ('-run', '-save', '-compare'):
+        results = bench.run()
+        for case, result in results.items():
+            print(f"{case:40} {result['opsPerSec']:>12} ops/sec {result['peakKB']:>10} KB")
+        if mode == '-save':
+            print('baseline saved to', bench.save(results, baseline_path))
+        elif mode == '-compare':
+            regressions = bench.compare(results, bench.load(baseline_path))
+            units = {'opsPerSec': 'ops/sec', 'peakKB': 'KB'}
+            for case, metrics in regressions.items():
+                for metric, regression in metrics.items():
+                    print(f"REGRESSION {case}: {regression['baseline']} -> {regression['current']} {units[metric]} ({regression['change']:+.1%})")
+            sys.exit(1 if regressions else 0)
+    else:
+        print('usage: nbnbench.py [-run | -save | -compare | -record | -impliedVolatility | -greeksCache | -transport | -startup] [--baseline=file] [--threshold=0.2] [--memoryThreshold=0.2] [--cassette=folder] [--latency=seconds]')
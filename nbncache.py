@@ -0,0 +1,232 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, time, timedelta
+import hashlib
+import os
+import pathlib
+import threading
+import nbncodec
+
+
+class NBNCache:
+    '''TTL cache for NSE responses with an LRU memory tier and an optional disk tier
+
+    A cached response is the same object for every caller until it expires, which outside market
+    hours is the next open. Callers must treat it as read only; one that needs to change it works on
+    a copy (copy.deepcopy), as copying every response on every hit would cost more than decoding it.
+    '''
+
+    ttl = {
+        'market_status': 60,
+        'all_indices': 15,
+        'eq_derivative_turnover': 30,
+        'market_turnover': 30,
+        'live_index': 5,
+        'live_fno': 5,
+        'index_option_chain': 3,
+    }
+    '''seconds a response stays fresh during market hours, per endpoint'''
+
+    default_ttl = 5
+    '''seconds a response stays fresh for endpoints missing in ttl'''
+
+    raw_endpoints = ('index_option_chain',)
+    '''endpoints that may be cached as a nbncodec.RawChain, read back from the disk tier as one'''
+
+    codec = nbncodec.NBNCodec()
+    '''codec used to write and read the disk tier'''
+
+    sample_items = 8
+    '''items of every list measured when estimating the size of a response'''
+
+    market_open = time(9, 15)
+    market_close = time(15, 30)
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, disk_path: str = None, ttl: dict = None):
+        """creates the cache
+
+        Args:
+            max_bytes (int, optional): size of the memory tier before least recently used entries are evicted. Defaults to 64MB.
+            disk_path (str, optional): folder for the disk tier, None to keep it in memory only. Defaults to None.
+            ttl (dict, optional): per endpoint overrides of the fresh seconds. Defaults to None.
+        """
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.ttl = dict(self.ttl, **(ttl or {}))
+        self.size = 0
+        self.__entries = OrderedDict()
+        self.__pending = {}
+        self.__lock = threading.Lock()
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'shared': 0, 'evictions': 0, 'endpoints': {}}
+
+    def expires_at(self, endpoint: str, now: datetime):
+        """returns the time a response fetched now stops being fresh
+
+        Outside market hours the data does not change, so responses stay fresh until the next open.
+
+        Args:
+            endpoint (str): NSE endpoint name
+            now (datetime): fetch time
+
+        Returns:
+            datetime: expiry time of the response
+        """
+        if now.weekday() < 5 and self.market_open <= now.time() < self.market_close:
+            return now + timedelta(seconds=self.ttl.get(endpoint, self.default_ttl))
+        next_open = datetime.combine(now.date(), self.market_open)
+        if now >= next_open:
+            next_open += timedelta(days=1)
+        while next_open.weekday() >= 5:
+            next_open += timedelta(days=1)
+        return next_open
+
+    def key(self, endpoint: str, args: tuple = ()):
+        """returns the cache key of an endpoint call"""
+        return endpoint + '|' + '|'.join(str(arg) for arg in args)
+
+    def estimate(self, value):
+        """returns the approximate size of a response encoded as json, measuring only sample_items items of every list"""
+        if isinstance(value, nbncodec.RawChain):
+            # what it decodes later is added by grow
+            return len(value)
+        if isinstance(value, (str, bytes)):
+            return len(value) + 2
+        if isinstance(value, dict):
+            return sum(len(name) + 4 + self.estimate(item) for name, item in value.items()) + 2
+        if isinstance(value, (list, tuple)):
+            if not value:
+                return 2
+            sample = value[:self.sample_items]
+            return sum(self.estimate(item) for item in sample) * len(value) // len(sample) + len(value) + 1
+        return 8
+
+    def get_or_fetch(self, endpoint: str, fetch, *args):
+        """returns the fresh cached response of an endpoint call, fetching it when missing or stale
+
+        Concurrent misses of the same call wait for the first one instead of fetching it again.
+
+        Args:
+            endpoint (str): NSE endpoint name
+            fetch (callable): function fetching the response from NSE
+            args: arguments of fetch, part of the cache key
+
+        Returns:
+            object: decoded response, shared with every other caller and not to be changed
+        """
+        key = self.key(endpoint, args)
+        now = datetime.now()
+        with self.__lock:
+            counters = self.stats['endpoints'].setdefault(endpoint, {'hits': 0, 'misses': 0})
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.__entries.move_to_end(key)
+                self.stats['hits'] += 1
+                counters['hits'] += 1
+                return entry[1]
+            pending = self.__pending.get(key)
+            if pending is not None:
+                self.stats['shared'] += 1
+                counters['hits'] += 1
+            else:
+                self.__pending[key] = Future()
+        if pending is not None:
+            return pending.result()
+        try:
+            value = self.__load(key, endpoint, fetch, args, now, counters)
+        except BaseException as error:
+            with self.__lock:
+                self.__pending.pop(key).set_exception(error)
+            raise
+        with self.__lock:
+            self.__pending.pop(key).set_result(value)
+        return value
+
+    def __load(self, key: str, endpoint: str, fetch, args: tuple, now: datetime, counters: dict):
+        """returns a response from the disk tier or from NSE and puts it in the memory tier"""
+        entry = self.read_disk(key, now)
+        if entry is not None:
+            with self.__lock:
+                self.stats['disk_hits'] += 1
+                counters['hits'] += 1
+            self.store(key, entry[0], entry[1], entry[2])
+            return entry[1]
+        with self.__lock:
+            self.stats['misses'] += 1
+            counters['misses'] += 1
+        value = fetch(*args)
+        expires = self.expires_at(endpoint, now)
+        if self.disk_path is None:
+            self.store(key, expires, value, self.estimate(value))
+            return value
+        # only the disk tier needs the encoded response, which then also gives the exact size
+        encoded = value.text if isinstance(value, nbncodec.RawChain) else self.codec.dumps(value)
+        self.store(key, expires, value, len(encoded))
+        self.write_disk(key, expires, encoded)
+        return value
+
+    def store(self, key: str, expires: datetime, value, size: int):
+        """puts a response in the memory tier, evicting the least recently used entries over max_bytes"""
+        if isinstance(value, nbncodec.RawChain):
+            value.listener = lambda payload: self.grow(key, value, self.estimate(payload))
+        with self.__lock:
+            old = self.__entries.pop(key, None)
+            if old is not None:
+                self.size -= old[2]
+            self.__entries[key] = (expires, value, size)
+            self.size += size
+            self.__evict()
+
+    def grow(self, key: str, value, size: int):
+        """adds to the size of a cached response what it decoded since it was stored, see nbncodec.RawChain"""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None or entry[1] is not value:
+                return
+            self.__entries[key] = (entry[0], value, entry[2] + size)
+            self.size += size
+            self.__evict()
+
+    def __evict(self):
+        """drops the least recently used entries while the memory tier is over max_bytes, keeping the newest"""
+        while self.size > self.max_bytes and len(self.__entries) > 1:
+            _, evicted = self.__entries.popitem(last=False)
+            self.size -= evicted[2]
+            self.stats['evictions'] += 1
+
+    def disk_file(self, key: str):
+        """returns the disk tier file of a cache key"""
+        return os.path.join(self.disk_path, hashlib.sha1(key.encode('utf8')).hexdigest() + '.json')
+
+    def read_disk(self, key: str, now: datetime):
+        """returns expiry, value and size of a fresh disk tier entry, or None"""
+        if self.disk_path is None:
+            return None
+        try:
+            with open(self.disk_file(key), 'r', encoding='utf8') as file:
+                expires = datetime.fromisoformat(file.readline().strip())
+                if expires <= now:
+                    return None
+                encoded = file.read()
+        except (OSError, ValueError):
+            return None
+        if key.split('|', 1)[0] in self.raw_endpoints:
+            return expires, nbncodec.RawChain(encoded), len(encoded)
+        return expires, self.codec.loads(encoded), len(encoded)
+
+    def write_disk(self, key: str, expires: datetime, encoded: str):
+        """writes an entry to the disk tier, replacing the old file atomically"""
+        if self.disk_path is None:
+            return
+        pathlib.Path(self.disk_path).mkdir(parents=True, exist_ok=True)
+        path = self.disk_file(key)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w', encoding='utf8') as file:
+            file.write(expires.isoformat() + '\n')
+            file.write(encoded)
+        os.replace(temp_path, path)
+
+    def clear(self):
+        """drops the memory tier"""
+        with self.__lock:
+            self.__entries.clear()
+            self.size = 0
@@ -0,0 +1,241 @@
+from bisect import bisect_left, bisect_right
+import calendar
+from datetime import date, datetime, time, timedelta
+import json
+import os
+import sys
+import threading
+
+
+class ExpiryCalendar:
+    '''Precomputed weekly and monthly expiries with exchange holidays'''
+
+    expiry_time = time(15, 30)
+    '''time of day at which the contracts expire'''
+
+    weekdays = {date.min: calendar.THURSDAY, date(2025, 9, 1): calendar.TUESDAY}
+    '''weekday of the index expiries from each date on: Thursday, then Tuesday since NSE moved them in September 2025'''
+
+    def __init__(self, start_year: int = None, end_year: int = None, holidays=(), weekday=None):
+        """computes every expiry between two years
+
+        An expiry falling on a holiday or a weekend moves to the previous trading day. Weekly expiries
+        fall on the weekday in effect that week and a monthly expiry on the weekday in effect on the
+        last day of its month.
+
+        Args:
+            start_year (int, optional): first year. Defaults to five years back.
+            end_year (int, optional): last year, extended on demand by the lookups. Defaults to five years ahead.
+            holidays (iterable, optional): exchange holidays as dates. Defaults to ().
+            weekday (int | dict, optional): weekday of the expiry, or per start date the weekday from that
+                date on, e.g. {date.min: calendar.THURSDAY}. Defaults to weekdays.
+        """
+        this_year = date.today().year
+        self.start_year = start_year if start_year is not None else this_year - 5
+        self.end_year = self.start_year - 1
+        self.holidays = set(holidays)
+        if weekday is None:
+            weekday = self.weekdays
+        self.schedule = sorted(weekday.items()) if isinstance(weekday, dict) else [(date.min, weekday)]
+        self.weekly = []
+        self.monthly = []
+        self.extend(end_year if end_year is not None else this_year + 5)
+
+    def is_trading_day(self, day: date):
+        """returns True when the exchange is open on a day"""
+        return day.weekday() < 5 and day not in self.holidays
+
+    def trading_day_on_or_before(self, day: date):
+        """returns the day itself or the previous trading day"""
+        while not self.is_trading_day(day):
+            day -= timedelta(days=1)
+        return day
+
+    def weekday_on(self, day: date):
+        """returns the expiry weekday in effect on a day"""
+        position = bisect_right(self.schedule, (day, 7)) - 1
+        return self.schedule[max(position, 0)][1]
+
+    def extend(self, end_year: int):
+        """computes the expiries of the years up to end_year that are not computed yet"""
+        if end_year <= self.end_year:
+            return
+        first = date(self.end_year + 1, 1, 1)
+        last = date(end_year, 12, 31)
+        for i, (start, weekday) in enumerate(self.schedule):
+            # the days from start to the next change of weekday, within the years computed now
+            stop = self.schedule[i + 1][0] - timedelta(days=1) if i + 1 < len(self.schedule) else last
+            day = max(start, first)
+            day += timedelta((weekday - day.weekday()) % 7)
+            while day <= min(stop, last):
+                self.weekly.append(self.trading_day_on_or_before(day))
+                day += timedelta(weeks=1)
+        for year in range(self.end_year + 1, end_year + 1):
+            for month in range(1, 13):
+                last = date(year, month, calendar.monthrange(year, month)[1])
+                last -= timedelta((last.weekday() - self.weekday_on(last)) % 7)
+                self.monthly.append(self.trading_day_on_or_before(last))
+        self.end_year = end_year
+
+    def __next(self, expiries: list, day: date):
+        """returns the first expiry on or after a day"""
+        if isinstance(day, datetime):
+            day = day.date()
+        if day.year >= self.end_year:
+            self.extend(day.year + 1)
+        return expiries[bisect_left(expiries, day)]
+
+    def next_weekly(self, day: date):
+        """returns the weekly expiry on or after a day
+
+        Args:
+            day (date): the day
+
+        Returns:
+            date: expiry date
+        """
+        return self.__next(self.weekly, day)
+
+    def next_monthly(self, day: date):
+        """returns the monthly expiry on or after a day
+
+        Args:
+            day (date): the day
+
+        Returns:
+            date: expiry date
+        """
+        return self.__next(self.monthly, day)
+
+    def time_to_expiry(self, expiry: date, now: datetime = None):
+        """returns the time to expire in years, as used by NBNGreeks
+
+        Args:
+            expiry (date): expiry date
+            now (datetime, optional): time to measure from. Defaults to current time.
+
+        Returns:
+            float: time to expire in years, never negative
+        """
+        now = now or datetime.now()
+        expiry_at = datetime.combine(expiry, self.expiry_time)
+        return max((expiry_at - now).total_seconds(), 0) / (365 * 24 * 60 * 60)
+
+    def time_to_next_expiry(self, now: datetime = None, monthly: bool = False):
+        """returns the time to the next weekly or monthly expiry in years, skipping today's after the close
+
+        Args:
+            now (datetime, optional): time to measure from. Defaults to current time.
+            monthly (bool, optional): use the monthly expiry. Defaults to False.
+
+        Returns:
+            float: time to expire in years
+        """
+        now = now or datetime.now()
+        day = now.date() if now.time() < self.expiry_time else now.date() + timedelta(days=1)
+        expiry = self.next_monthly(day) if monthly else self.next_weekly(day)
+        return self.time_to_expiry(expiry, now)
+
+
+holidays_file = os.path.join('assets', 'holidays.json')
+'''checked in copy of the NSE trading holidays, shaped like the holiday_list response'''
+
+holiday_segment = 'FO'
+'''segment of the holiday list the derivative expiries follow'''
+
+symbol_weekdays = {}
+'''per symbol expiry weekday schedule (see ExpiryCalendar) for symbols that do not follow ExpiryCalendar.weekdays'''
+
+__default = {}
+__default_lock = threading.Lock()
+
+
+def holidays_path():
+    """returns the path of the holidays file, next to the data assets and else next to this module"""
+    base = getattr(sys, '_MEIPASS', os.path.abspath('.'))
+    path = os.path.join(base, holidays_file)
+    if not os.path.exists(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), holidays_file)
+    return path
+
+
+def parse_holidays(response, segment: str = holiday_segment):
+    """returns the holidays of a segment of the NSE holiday list
+
+    Args:
+        response (object): holiday_list response, per segment a list of entries with a tradingDate like 26-Jan-2024
+        segment (str, optional): segment. Defaults to holiday_segment.
+
+    Returns:
+        list: sorted dates
+    """
+    return sorted({datetime.strptime(entry['tradingDate'], '%d-%b-%Y').date() for entry in response.get(segment, [])})
+
+
+def read_holidays(path: str = None, segment: str = holiday_segment):
+    """returns the holidays of the holidays file, none when it is missing or unreadable
+
+    Args:
+        path (str, optional): holidays file. Defaults to holidays_path().
+        segment (str, optional): segment. Defaults to holiday_segment.
+
+    Returns:
+        list: sorted dates
+    """
+    try:
+        with open(path or holidays_path(), 'r', encoding='utf8') as file:
+            return parse_holidays(json.load(file), segment)
+    except (OSError, ValueError, KeyError):
+        return []
+
+
+def refresh_holidays(client, path: str = None, segment: str = holiday_segment):
+    """fetches the holiday list from NSE and merges it into the holidays file, kept as the fallback when NSE is unreachable
+
+    Args:
+        client (object): client with holiday_list, e.g. nbnclient.NBNClient
+        path (str, optional): holidays file. Defaults to holidays_path().
+        segment (str, optional): segment. Defaults to holiday_segment.
+
+    Returns:
+        list: sorted dates of the merged list
+    """
+    path = path or holidays_path()
+    try:
+        with open(path, 'r', encoding='utf8') as file:
+            cached = json.load(file)
+    except (OSError, ValueError):
+        cached = {}
+    entries = {entry['tradingDate']: entry for entry in cached.get(segment, [])}
+    # NSE only lists the current year, earlier years are kept from the file
+    for entry in client.holiday_list().get(segment, []):
+        entries[entry['tradingDate']] = {name: entry[name] for name in ('tradingDate', 'weekDay', 'description') if name in entry}
+    merged = {segment: sorted(entries.values(), key=lambda entry: datetime.strptime(entry['tradingDate'], '%d-%b-%Y'))}
+    with open(path, 'w', encoding='utf8') as file:
+        json.dump(merged, file, indent=2)
+    with __default_lock:
+        __default.clear()
+    return parse_holidays(merged, segment)
+
+
+def default_calendar(symbol: str = None):
+    """returns the calendar shared by NBNDetails and NBNGreeks, built with the holidays file on first use
+
+    Args:
+        symbol (str, optional): underlying, whose schedule is looked up in symbol_weekdays. Defaults to
+            None, the index expiries of ExpiryCalendar.weekdays.
+
+    Returns:
+        ExpiryCalendar: the calendar, one per schedule
+    """
+    with __default_lock:
+        if symbol not in __default:
+            __default[symbol] = ExpiryCalendar(holidays=read_holidays(), weekday=symbol_weekdays.get(symbol))
+        return __default[symbol]
+
+
+class SharedCalendar:
+    '''Class attribute reading as default_calendar(), so that it is only built when first used'''
+
+    def __get__(self, instance, owner):
+        return default_calendar()
@@ -0,0 +1,165 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+
+class OptionChain:
+    '''Option chain payload indexed by expiry and strike'''
+
+    date_format = '%d-%b-%Y'
+
+    tracked_fields = ('lastPrice', 'openInterest', 'totalTradedVolume', 'impliedVolatility')
+    '''fields compared between two snapshots of the chain'''
+
+    def __init__(self, state):
+        """indexes the payload returned by index_option_chain once
+
+        Args:
+            state (object): option chain payload with records and filtered sections
+        """
+        records = state['records']
+        self.state = state
+        self.underlying_value = records['underlyingValue']
+        self.timestamp = records.get('timestamp')
+        self.expiry_dates = records['expiryDates']
+        self.expiry = {expiry: datetime.strptime(expiry, self.date_format) for expiry in self.expiry_dates}
+        self.strike_prices = sorted(records['strikePrices'])
+        self.rows = {}
+        for row in records['data']:
+            self.rows.setdefault(row['expiryDate'], []).append(row)
+        self.strikes = {}
+        for expiry, rows in self.rows.items():
+            rows.sort(key=lambda row: row['strikePrice'])
+            self.strikes[expiry] = [row['strikePrice'] for row in rows]
+        filtered = state.get('filtered', {}).get('data', [])
+        self.filtered = sorted(filtered, key=lambda row: row['strikePrice'])
+        self.filtered_strikes = [row['strikePrice'] for row in self.filtered]
+        self.__values = None
+
+    def next_expiry(self, now: datetime = None):
+        """returns the nearest expiry, moving to the following one on the expiry day itself
+
+        Args:
+            now (datetime, optional): current time. Defaults to datetime.now().
+
+        Returns:
+            str: expiry date as given by NSE
+        """
+        today = (now or datetime.now()).strftime(self.date_format)
+        if self.expiry_dates[0] == today and len(self.expiry_dates) > 1:
+            return self.expiry_dates[1]
+        return self.expiry_dates[0]
+
+    def month_expiry(self, expiry: str):
+        """returns the last expiry in the same month as the given expiry
+
+        Args:
+            expiry (str): expiry date as given by NSE
+
+        Returns:
+            str: the monthly expiry date
+        """
+        expiry_date = self.expiry[expiry]
+        month = [x for x in self.expiry_dates
+                 if self.expiry[x].year == expiry_date.year and self.expiry[x].month == expiry_date.month]
+        return month[-1] if month else expiry
+
+    def nearby_strikes(self, spot: float, count: int):
+        """returns the count strikes nearest to spot, lower strike first on ties
+
+        Args:
+            spot (float): price the distance is measured from
+            count (int): number of strikes
+
+        Returns:
+            list: sorted strikes
+        """
+        strikes = self.strike_prices
+        low = high = bisect_left(strikes, spot)
+        while high - low < count and (low > 0 or high < len(strikes)):
+            if high >= len(strikes) or (low > 0 and spot - strikes[low - 1] <= strikes[high] - spot):
+                low -= 1
+            else:
+                high += 1
+        return strikes[low:high]
+
+    def __slice(self, rows, strikes, nearby):
+        """returns the rows whose strike is within the sorted nearby strikes"""
+        if not nearby:
+            return []
+        start = bisect_left(strikes, nearby[0])
+        end = bisect_right(strikes, nearby[-1])
+        wanted = set(nearby)
+        return [row for row in rows[start:end] if row['strikePrice'] in wanted]
+
+    def expiry_rows(self, expiry: str, nearby: list):
+        """returns the rows of an expiry for the given strikes
+
+        Args:
+            expiry (str): expiry date as given by NSE
+            nearby (list): sorted strikes, e.g. from nearby_strikes
+
+        Returns:
+            list: option chain rows
+        """
+        return self.__slice(self.rows.get(expiry, []), self.strikes.get(expiry, []), nearby)
+
+    def filtered_rows(self, nearby: list):
+        """returns the rows of the filtered (nearest expiry) section for the given strikes
+
+        Args:
+            nearby (list): sorted strikes, e.g. from nearby_strikes
+
+        Returns:
+            list: option chain rows
+        """
+        return self.__slice(self.filtered, self.filtered_strikes, nearby)
+
+    def tracked_values(self):
+        """returns the tracked field values of every leg, keyed by (expiry, strike, CE/PE)
+
+        Returns:
+            dict: tuples of tracked_fields values
+        """
+        if self.__values is None:
+            fields = self.tracked_fields
+            values = {}
+            for expiry, rows in self.rows.items():
+                for row in rows:
+                    for leg_type in ('CE', 'PE'):
+                        leg = row.get(leg_type)
+                        if leg:
+                            values[(expiry, row['strikePrice'], leg_type)] = tuple(leg.get(field) for field in fields)
+            self.__values = values
+        return self.__values
+
+    def diff(self, previous=None):
+        """returns the legs whose tracked fields changed since a previous snapshot of the chain
+
+        Args:
+            previous (OptionChain, optional): earlier snapshot, None to report every leg. Defaults to None.
+
+        Returns:
+            object: summary of the tick, changed legs with their tracked values and removed legs
+        """
+        values = self.tracked_values()
+        old_values = previous.tracked_values() if previous is not None else {}
+        changed = []
+        for key, current in values.items():
+            if old_values.get(key) != current:
+                leg = {'expiryDate': key[0], 'strikePrice': key[1], 'type': key[2]}
+                leg.update(zip(self.tracked_fields, current))
+                changed.append(leg)
+        removed = [{'expiryDate': key[0], 'strikePrice': key[1], 'type': key[2]}
+                   for key in old_values if key not in values]
+        return {
+            'summary': {
+                'timestamp': self.timestamp,
+                'underlyingValue': self.underlying_value,
+                'previousUnderlyingValue': previous.underlying_value if previous is not None else None,
+                'legs': len(values),
+                'changed': len(changed),
+                'removed': len(removed),
+            },
+            'changed': changed,
+            'removed': removed,
+        }
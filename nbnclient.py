@@ -0,0 +1,148 @@
+from requests import Session
+from requests.adapters import HTTPAdapter
+from jugaad_data.nse import NSELive
+import nbncodec
+import nbnprofile
+
+
+class NBNClient(NSELive):
+    '''Long lived NSE client that keeps one pooled keep-alive session and its cookies'''
+
+    time_out = 0
+    '''freshness is handled by NBNCache, so the jugaad per call cache is disabled'''
+
+    request_timeout = 10
+    '''seconds to wait for a response from NSE'''
+
+    profiler = nbnprofile.NBNProfiler()
+    '''profiler timing the network and decode phases, replaced by NiftyBankNifty with its own'''
+
+    codec = nbncodec.NBNCodec()
+    '''codec the responses are decoded with, orjson when installed'''
+
+    auth_status = (401, 403)
+    '''status codes after which the cookies are negotiated again'''
+
+    headers = {
+        'Host': 'www.nseindia.com',
+        'Referer': 'https://www.nseindia.com/get-quotes/equity?symbol=SBIN',
+        'X-Requested-With': 'XMLHttpRequest',
+        'pragma': 'no-cache',
+        'sec-fetch-dest': 'empty',
+        'sec-fetch-mode': 'cors',
+        'sec-fetch-site': 'same-origin',
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/87.0.4280.88 Safari/537.36',
+        'Accept': '*/*',
+        'Accept-Encoding': 'gzip, deflate',
+        'Accept-Language': 'en-GB,en-US;q=0.9,en;q=0.8',
+        'Cache-Control': 'no-cache',
+        'Connection': 'keep-alive',
+    }
+    '''browser like headers NSE expects'''
+
+    def __init__(self, base_url: str = None, page_url: str = None, pool_size: int = 10, adapter=None):
+        """creates the session, mounts a connection pool and negotiates the NSE cookies once
+
+        Args:
+            base_url (str, optional): api url, e.g. a local stand-in server. Defaults to NSE.
+            page_url (str, optional): page fetched to get the cookies. Defaults to NSE.
+            pool_size (int, optional): connections kept alive per host. Defaults to 10.
+            adapter (requests.adapters.BaseAdapter, optional): transport to mount instead of the pooled
+                HTTPAdapter, e.g. to record or replay responses. Defaults to None.
+        """
+        if base_url is not None:
+            self.base_url = base_url.rstrip('/')
+        if page_url is not None:
+            self.page_url = page_url
+        self.pool_size = pool_size
+        self.s = Session()
+        if adapter is None:
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.s.mount('https://', adapter)
+        self.s.mount('http://', adapter)
+        self.s.headers.update(self.headers)
+        if base_url is not None:
+            # the NSE host header would be wrong for any other server
+            self.s.headers.pop('Host', None)
+        self.s.get(self.page_url, timeout=self.request_timeout)
+
+    def refresh_cookies(self):
+        """fetches the landing page again so that NSE issues fresh cookies"""
+        self.s.cookies.clear()
+        self.s.get(self.page_url, timeout=self.request_timeout)
+
+    def get_raw(self, route, payload={}):
+        """returns the undecoded body of an NSE api route on the shared session
+
+        Args:
+            route (str): route name from NSELive
+            payload (dict, optional): query parameters. Defaults to {}.
+
+        Returns:
+            bytes: response body
+        """
+        url = self.base_url + self._routes[route]
+        with self.profiler.span('network'):
+            response = self.s.get(url, params=payload, timeout=self.request_timeout)
+            if response.status_code in self.auth_status:
+                self.refresh_cookies()
+                response = self.s.get(url, params=payload, timeout=self.request_timeout)
+            response.raise_for_status()
+            return response.content
+
+    def get(self, route, payload={}):
+        """returns the decoded response of an NSE api route on the shared session
+
+        Args:
+            route (str): route name from NSELive
+            payload (dict, optional): query parameters. Defaults to {}.
+
+        Returns:
+            object: decoded json response
+        """
+        raw = self.get_raw(route, payload)
+        with self.profiler.span('decode'):
+            return self.codec.loads(raw)
+
+    def option_chain_request(self, symbol='NIFTY', expiry=None):
+        """returns the route and query parameters NSELive.index_option_chain requests for an index
+
+        Args:
+            symbol (str, optional): index. Defaults to 'NIFTY'.
+            expiry (str, optional): expiry date. Defaults to the nearest one, looked up in the contract info.
+
+        Returns:
+            tuple: route name and query parameters, None when jugaad_data has no option chain route
+        """
+        if 'option_chain_v3' in self._routes:
+            if not expiry:
+                contract_info = self.option_chain_contract_info(symbol)
+                if contract_info.get('expiryDates'):
+                    expiry = contract_info['expiryDates'][0]
+            payload = {'type': 'Indices', 'symbol': symbol}
+            if expiry:
+                payload['expiry'] = expiry
+            return 'option_chain_v3', payload
+        if 'index_option_chain' in self._routes:
+            return 'index_option_chain', {'symbol': symbol}
+        return None
+
+    def index_option_chain_raw(self, symbol='NIFTY', expiry=None):
+        """returns the undecoded option chain of an index, for nbncodec.ChainDecoder
+
+        Args:
+            symbol (str, optional): index. Defaults to 'NIFTY'.
+            expiry (str, optional): expiry date. Defaults to the nearest one.
+
+        Returns:
+            bytes: response body of the request index_option_chain makes, None when there is no
+                known route, in which case index_option_chain has to be used
+        """
+        request = self.option_chain_request(symbol, expiry)
+        if request is None:
+            return None
+        return self.get_raw(*request)
+
+    def close(self):
+        """closes the pooled connections"""
+        self.s.close()
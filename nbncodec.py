@@ -0,0 +1,305 @@
+import json
+import re
+import threading
+
+
+class NBNCodec:
+    '''JSON codec backed by orjson when it is installed, falling back to the standard json module'''
+
+    backends = ('orjson', 'json')
+    '''backends tried in order when none is named'''
+
+    def __init__(self, name: str = None):
+        """picks the backend
+
+        Args:
+            name (str, optional): orjson or json. Defaults to the first installed of backends.
+        """
+        self.name = None
+        for backend in ((name,) if name is not None else self.backends):
+            if backend == 'json':
+                self.name = 'json'
+                break
+            try:
+                # optional dependency, only used when installed
+                import orjson
+            except ImportError:
+                if name is not None:
+                    raise
+                continue
+            self.__orjson = orjson
+            self.name = 'orjson'
+            break
+        if self.name is None:
+            raise ValueError(f'unknown codec {name}, use one of {", ".join(self.backends)}')
+
+    def loads(self, data):
+        """decodes JSON from bytes or str"""
+        if self.name == 'orjson':
+            return self.__orjson.loads(data)
+        return json.loads(data)
+
+    def dumps(self, value):
+        """encodes a value as compact JSON text"""
+        if self.name == 'orjson':
+            return self.__orjson.dumps(value).decode('utf8')
+        return json.dumps(value, separators=(',', ':'))
+
+
+class ChainDecoder:
+    '''Decodes only the rows and fields of a raw option chain response that are asked for
+
+    The response is scanned for the start of each row ({"strikePrice": .., "expiryDate": ..}) and
+    for the few scalar fields of records, so the strike and expiry of every row are known without
+    decoding it. Only the selected rows are then decoded, each from its own slice of the text,
+    and the rest of the payload is never turned into objects. Responses that do not look as
+    expected are decoded whole and filtered the same way.
+    '''
+
+    row_start = re.compile(r'\{\s*"strikePrice"\s*:\s*(-?[0-9.eE+-]+)\s*,\s*"expiryDate"\s*:\s*"([^"]*)"')
+    '''start of an option chain row or of one of its legs, starting with a literal so that the regex
+    engine can skip ahead to it; rows follow [ or , and legs follow a colon'''
+
+    header_fields = ('expiryDates', 'timestamp', 'underlyingValue', 'strikePrices')
+    '''fields of records decoded with the header'''
+
+    def __init__(self, codec: NBNCodec = None):
+        """sets the codec the selected rows are decoded with
+
+        Args:
+            codec (NBNCodec, optional): codec. Defaults to NBNCodec().
+        """
+        self.codec = codec or NBNCodec()
+        self.__decoder = json.JSONDecoder()
+
+    def scan(self, text: str):
+        """returns the layout of a raw option chain: header fields and the rows of records and filtered
+
+        Args:
+            text (str): raw response
+
+        Returns:
+            dict: header (records fields without data), and per section (records, filtered) a list
+                of (strike, expiry, start, end) of every row, None when the text does not look like
+                an option chain
+        """
+        records = re.search(r'"records"\s*:\s*\{', text)
+        if records is None:
+            return None
+        filtered = re.search(r'"filtered"\s*:\s*\{', text)
+        data = re.compile(r'"data"\s*:\s*\[').search(text, records.end())
+        if data is None:
+            return None
+        sections = {'records': [], 'filtered': []}
+        matches = []
+        for match in self.row_start.finditer(text):
+            before = match.start() - 1
+            if text[before] != ':':
+                while text[before] in ' \t\r\n':
+                    before -= 1
+                if text[before] != ':':
+                    matches.append(match)
+        for i, match in enumerate(matches):
+            position = match.start()
+            in_records = position > records.start() and (filtered is None or filtered.start() < records.start()
+                                                          or position < filtered.start())
+            section = sections['records' if in_records else 'filtered']
+            following = matches[i + 1].start() if i + 1 < len(matches) else None
+            section.append([float(match.group(1)), match.group(2), position, following])
+        for rows in sections.values():
+            for i, row in enumerate(rows):
+                # the next row of the same array bounds this one, the last row is measured by decoding it
+                if i + 1 == len(rows) or rows[i + 1][2] != row[3]:
+                    row[3] = None
+        # rows whose keys come in another order would be missed, the first row must start the data array
+        first = re.compile(r'\S').search(text, data.end())
+        first = first.start() if first is not None else None
+        if (sections['records'][0][2] if sections['records'] else text.find(']', data.end())) != first:
+            return None
+        # the records fields are searched around its data array, where the legs cannot be
+        end = data.end()
+        if sections['records']:
+            last = sections['records'][-1]
+            end = last[3] if last[3] is not None else self.__decoder.raw_decode(text, last[2])[1]
+        close = text.index(']', end)
+        limit = filtered.start() if filtered is not None and filtered.start() > close else len(text)
+        header = {}
+        for field in self.header_fields:
+            pattern = re.compile('"' + field + r'"\s*:\s*')
+            found = pattern.search(text, records.end(), data.start()) or pattern.search(text, close, limit)
+            if found is not None:
+                header[field] = self.__decoder.raw_decode(text, found.end())[0]
+        if 'expiryDates' not in header or 'strikePrices' not in header:
+            return None
+        return {'header': header, 'records': sections['records'], 'filtered': sections['filtered']}
+
+    def row(self, text: str, start: int, end: int = None):
+        """decodes one row from its start, up to the start of the next row when known"""
+        if end is None:
+            return self.__decoder.raw_decode(text, start)[0]
+        return self.codec.loads(text[start:end].rstrip().rstrip(','))
+
+    @staticmethod
+    def trim(row: dict, fields):
+        """returns a row keeping only the given fields of its legs"""
+        if fields is None:
+            return row
+        trimmed = {'strikePrice': row['strikePrice'], 'expiryDate': row['expiryDate']}
+        for leg in ('CE', 'PE'):
+            if leg in row:
+                trimmed[leg] = {field: row[leg][field] for field in fields if field in row[leg]}
+        return trimmed
+
+    def prepare(self, raw):
+        """returns the text of a raw option chain, its layout, and the decoded payload when there is no layout
+
+        A RawChain gives its own layout, or its decoded payload when it already has one, so that
+        neither is worked out again.
+        """
+        if isinstance(raw, RawChain):
+            state = raw.decoded
+            if state is None:
+                layout = raw.layout()
+                state = raw.state if layout is None else None
+            else:
+                layout = None
+            return raw.text, layout, state
+        text = raw.decode('utf8') if isinstance(raw, bytes) else raw
+        layout = self.scan(text)
+        return text, layout, self.codec.loads(text) if layout is None else None
+
+    def header(self, raw):
+        """returns the payload of a raw option chain without any rows
+
+        Args:
+            raw (bytes): raw response, its text or a RawChain
+
+        Returns:
+            object: payload with the records fields, an empty records data and filtered data
+        """
+        _, layout, state = self.prepare(raw)
+        if layout is None:
+            return {'records': dict(state['records'], data=[]), 'filtered': {'data': []}}
+        return {'records': dict(layout['header'], data=[]), 'filtered': {'data': []}}
+
+    def decode(self, raw, expiries=None, strikes=None, fields=None, select=None):
+        """returns an option chain payload holding only the selected rows
+
+        Args:
+            raw (bytes): raw response, its text or a RawChain
+            expiries (iterable, optional): expiry dates of the records rows kept. Defaults to every expiry.
+            strikes (iterable, optional): strikes of the rows kept. Defaults to every strike.
+            fields (iterable, optional): leg fields kept. Defaults to every field.
+            select (callable, optional): called with the header payload (see header) before any row is
+                decoded, returns the expiries and strikes to keep in place of the arguments. Defaults to None.
+
+        Returns:
+            object: payload shaped as the index_option_chain response with records and filtered data
+        """
+        text, layout, state = self.prepare(raw)
+        if layout is None:
+            header = {'records': dict(state['records'], data=[]), 'filtered': {'data': []}}
+            rows = {'records': [(row['strikePrice'], row['expiryDate'], row) for row in state['records']['data']],
+                    'filtered': [(row['strikePrice'], row['expiryDate'], row)
+                                 for row in state.get('filtered', {}).get('data', [])]}
+        else:
+            header = {'records': dict(layout['header'], data=[]), 'filtered': {'data': []}}
+            rows = {section: [(strike, expiry, (start, end)) for strike, expiry, start, end in layout[section]]
+                    for section in ('records', 'filtered')}
+        if select is not None:
+            expiries, strikes = select(header)
+        expiries = None if expiries is None else set(expiries)
+        strikes = None if strikes is None else {float(strike) for strike in strikes}
+        for section in ('records', 'filtered'):
+            kept = header[section]['data']
+            for strike, expiry, row in rows[section]:
+                if strikes is not None and float(strike) not in strikes:
+                    continue
+                if section == 'records' and expiries is not None and expiry not in expiries:
+                    continue
+                if isinstance(row, tuple):
+                    row = self.row(text, *row)
+                kept.append(self.trim(row, fields))
+        return header
+
+
+class RawChain:
+    '''Raw option chain response that is decoded at most once, whole or in the selected rows
+
+    The cache keeps it in place of the decoded payload: the layout of the text (see
+    ChainDecoder.scan), the decoded payload and every selection of rows are worked out on first use
+    and kept with it, so polls served from the same response share them.
+    '''
+
+    listener = None
+    '''called with every payload decoded from the text once it is kept, e.g. by NBNCache to count its size'''
+
+    def __init__(self, raw, decoder: ChainDecoder = None):
+        """keeps the response text
+
+        Args:
+            raw (bytes): response body, or its text
+            decoder (ChainDecoder, optional): decoder. Defaults to ChainDecoder().
+        """
+        self.text = raw.decode('utf8') if isinstance(raw, bytes) else raw
+        self.decoder = decoder or ChainDecoder()
+        self.__layout = None
+        self.__scanned = False
+        self.__state = None
+        self.__header = None
+        self.__selections = {}
+        self.__lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.text)
+
+    @property
+    def decoded(self):
+        """the decoded payload when it was already needed, else None"""
+        return self.__state
+
+    @property
+    def state(self):
+        """the decoded payload, as index_option_chain returns it"""
+        with self.__lock:
+            if self.__state is None:
+                self.__state = self.decoder.codec.loads(self.text)
+                self.__kept(self.__state)
+            return self.__state
+
+    def layout(self):
+        """returns the layout of the text, see ChainDecoder.scan"""
+        with self.__lock:
+            if not self.__scanned:
+                self.__layout = self.decoder.scan(self.text)
+                self.__scanned = True
+            return self.__layout
+
+    def header(self):
+        """returns the payload without any rows, see ChainDecoder.header"""
+        with self.__lock:
+            if self.__header is None:
+                self.__header = self.decoder.header(self)
+            return self.__header
+
+    def select(self, key, select):
+        """returns the payload holding only the rows a selection keeps, see ChainDecoder.decode
+
+        Args:
+            key (object): hashable name of the selection, the same key returns the same payload
+            select (callable): called with the header payload the first time a key is asked for,
+                returns the expiries and strikes to keep
+
+        Returns:
+            object: payload shaped as the index_option_chain response, decoded once per key
+        """
+        with self.__lock:
+            if key not in self.__selections:
+                self.__selections[key] = self.decoder.decode(self, select=select)
+                self.__kept(self.__selections[key])
+            return self.__selections[key]
+
+    def __kept(self, payload):
+        """tells the listener about a payload kept with the text"""
+        if self.listener is not None:
+            self.listener(payload)
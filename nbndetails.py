@@ -1,39 +1,37 @@
-import calendar
-# from calendar import THURSDAY, calendar
 from datetime import datetime, timedelta
+import nbncalendar
 
 
 class NBNDetails:
     '''Nifty BankNify Strategy Class'''
-    today = datetime.today()
+    today: datetime
     next_weekly_expiry: datetime
     next_monthly_expiry: datetime
 
+    calendar = nbncalendar.SharedCalendar()
+    '''expiry calendar with the NSE holidays, shared with NBNGreeks'''
+
     def __init__(self):
-        self.next_weekly_expiry = self.today + \
-            timedelta((calendar.THURSDAY -self.today.weekday()) % 7)
-        next_shift_date = (self.today.replace(day=1) + timedelta(days=32)).replace(day=1)
-        # reduce 1 day in case 1st of next month is thursday
-        next_shift_date = next_shift_date + timedelta(days=-1)
-        while (next_shift_date.weekday() is not calendar.THURSDAY and next_shift_date > self.today):
-            next_shift_date = next_shift_date + timedelta(days=-1)
-            # print (next_shift_date)
-        self.next_monthly_expiry = next_shift_date
-        # if today is more than last thursday
-        if next_shift_date <= self.today:
-            next_shift_date = (self.today.replace(day=1) + timedelta(days=64)).replace(day=1)
-            next_shift_date = next_shift_date + timedelta(days=-1)
-            while (next_shift_date.weekday() is not calendar.THURSDAY and next_shift_date > self.today):
-                next_shift_date = next_shift_date + timedelta(days=-1)
-                # print (next_shift_date)
-            self.next_monthly_expiry = next_shift_date
-
-
-
-    def get_expiry(self):
+        expiry = self.get_expiry()
+        self.next_weekly_expiry = expiry['week']
+        self.next_monthly_expiry = expiry['month']
+
+    def get_expiry(self, today: datetime = None):
+        """Returns the next weekly and monthly expiry
+
+        Args:
+            today (datetime, optional): day to look from. Defaults to the current time.
+
+        Returns:
+            object: weekly expiry on or after today and monthly expiry after today
+        """
+        self.today = today or datetime.today()
+        week = self.calendar.next_weekly(self.today)
+        # the monthly expiry moves to the next month on the expiry day itself
+        month = self.calendar.next_monthly(self.today + timedelta(days=1))
         return {
-            'week': self.next_weekly_expiry,
-            'month': self.next_monthly_expiry
+            'week': datetime.combine(week, self.today.time()),
+            'month': datetime.combine(month, self.today.time())
         }
 
     # ohlc from nifty class
@@ -46,18 +44,94 @@ class NBNDetails:
         Returns:
             object: different pivots
         """
-        # ToDo: parallel
-        classic = self.get_pivotdetails('classic', ohlc)
-        woodie = self.get_pivotdetails('woodie', ohlc)
-        camarilla = self.get_pivotdetails('camarilla', ohlc)
-        demark = self.get_pivotdetails('demark', ohlc)
-        fibonacci = self.get_pivotdetails('fibonacci', ohlc)
+        open, high, low, close = ohlc['o'], ohlc['h'], ohlc['l'], ohlc['c']
+        if close < open:
+            de_mid = high + (2 * low) + close
+        elif close > open:
+            de_mid = (2 * high) + low + close
+        else:
+            de_mid = high + low + (2 * close)
+        pivots = self.get_pivot_levels(high, low, close, de_mid)
+        return {
+            name: {level: round(value, 2) for level, value in levels.items()}
+            for name, levels in pivots.items()
+        }
+
+    def get_pivot_array(self, open, high, low, close, decimals=2):
+        """Returns the classic, woodie, camarilla, demark and fibonacci pivots of N bars in one pass
+
+        Args:
+            open (array_like): open of each bar
+            high (array_like): high of each bar
+            low (array_like): low of each bar
+            close (array_like): close of each bar
+            decimals (int, optional): rounding applied to the levels, None to keep full precision. Defaults to 2.
+
+        Returns:
+            object: arrays of support and resistance levels per pivot type, same keys as get_pivot
+        """
+        import numpy
+        open, high, low, close = (numpy.asarray(x, dtype=numpy.float64) for x in (open, high, low, close))
+        de_mid = numpy.where(close < open, high + (2 * low) + close,
+                             numpy.where(close > open, (2 * high) + low + close, high + low + (2 * close)))
+        pivots = self.get_pivot_levels(high, low, close, de_mid)
+        if decimals is not None:
+            for levels in pivots.values():
+                for level in levels:
+                    levels[level] = numpy.round(levels[level], decimals)
+        return pivots
+
+    def get_pivot_levels(self, high, low, close, de_mid):
+        """Returns the support and resistance levels of every pivot type, for floats or arrays alike
+
+        Args:
+            high (float | numpy.ndarray): high
+            low (float | numpy.ndarray): low
+            close (float | numpy.ndarray): close
+            de_mid (float | numpy.ndarray): demark mid value, which depends on close versus open
+
+        Returns:
+            object: unrounded levels per pivot type
+        """
+        spread = high - low
+        pivot = (high + low + close) / 3
+        woodie = (high + low + (close * 2)) / 4
+        camarilla = spread * 1.1
         return {
-            'classic': classic,
-            'woodie': woodie,
-            'camarilla': camarilla,
-            'demark': demark,
-            'fibonacci': fibonacci,
+            'classic': {
+                'support1': pivot * 2 - high,
+                'support2': pivot - spread,
+                'support3': low - 2*(high - pivot),
+                'resistance1': pivot * 2 - low,
+                'resistance2': pivot + spread,
+                'resistance3': high + 2*(pivot - low),
+            },
+            'woodie': {
+                'support1': (2 * woodie) - high,
+                'support2': woodie - spread,
+                'resistance1': (2 * woodie) - low,
+                'resistance2': woodie + spread,
+            },
+            'camarilla': {
+                'support1': close - camarilla / 12,
+                'support2': close - camarilla / 6,
+                'support3': close - camarilla / 4,
+                'resistance1': camarilla / 12 + close,
+                'resistance2': camarilla / 6 + close,
+                'resistance3': camarilla / 4 + close,
+            },
+            'demark': {
+                'support1': de_mid/2 - high,
+                'resistance1': de_mid/2 - low,
+            },
+            'fibonacci': {
+                'support1': pivot - (0.382 * spread),
+                'support2': pivot - (0.6182 * spread),
+                'support3': pivot - (1 * spread),
+                'resistance1': pivot + (0.382 * spread),
+                'resistance2': pivot + (0.6182 * spread),
+                'resistance3': pivot + (1 * spread),
+            },
         }
 
     def get_pivotdetails(self, type, ohlc):
@@ -70,81 +144,4 @@ class NBNDetails:
         :return: A dictionary with the keys support1, support2, support3, resistance1, resistance2,
         resistance3.
         """
-        open = ohlc['o']
-        high = ohlc['h']
-        low = ohlc['l']
-        close = ohlc['c']
-        pivot = support1 = support2 = support3 = resistance1 = resistance2 = resistance3 = -1
-        if type == 'classic':
-            pivot = (high + low + close)/3
-            support1 = pivot * 2 - high
-            support2 = pivot - (high - low)
-            support3 = low - 2*(high - pivot)
-            resistance1 = pivot * 2 - low
-            resistance2 = pivot + (high - low)
-            resistance3 = high + 2*(pivot - low)
-            return {
-                'support1': round(support1, 2),
-                'support2': round(support2, 2),
-                'support3': round(support3, 2),
-                'resistance1': round(resistance1, 2),
-                'resistance2': round(resistance2, 2),
-                'resistance3': round(resistance3, 2)
-            }
-        if type == 'woodie':
-            pivot = (high + low + (close * 2)) / 4
-            resistance2 = pivot + (high - low)
-            resistance1 = (2 * pivot) - low
-            support1 = (2 * pivot) - high
-            support2 = pivot - (high - low)
-            return {
-                'support1': round(support1, 2),
-                'support2': round(support2, 2),
-                'resistance1': round(resistance1, 2),
-                'resistance2': round(resistance2, 2),
-            }
-        if type == 'camarilla':
-            resistance3 = ((high - low) * 1.1) / 4 + close
-            resistance2 = ((high - low) * 1.1) / 6 + close
-            resistance1 = ((high - low) * 1.1) / 12 + close
-            support1 = close - ((high - low) * 1.1) / 12
-            support2 = close - ((high - low) * 1.1) / 6
-            support3 = close - ((high - low) * 1.1) / 4
-            return {
-                'support1': round(support1, 2),
-                'support2': round(support2, 2),
-                'support3': round(support3, 2),
-                'resistance1': round(resistance1, 2),
-                'resistance2': round(resistance2, 2),
-                'resistance3': round(resistance3, 2)
-            }
-        if type == 'demark':
-            de_mid = 0
-            if close < open:
-                de_mid = high + (2 * low) + close
-            if close > open:
-                de_mid = (2 * high) + low + close
-            if close == open:
-                de_mid = high + low + (2 * close)
-            support1 = de_mid/2 - high
-            resistance1 = de_mid/2 - low
-            return {
-                'support1': round(support1, 2),
-                'resistance1': round(resistance1, 2),
-            }
-        if type == 'fibonacci':
-            pivot = (high + low + close)/3
-            support1 = pivot - (0.382 * (high - low))
-            support2 = pivot - (0.6182 * (high - low))
-            support3 = pivot - (1 * (high - low))
-            resistance1 = pivot + (0.382 * (high - low))
-            resistance2 = pivot + (0.6182 * (high - low))
-            resistance3 = pivot + (1 * (high - low))
-            return {
-                'support1': round(support1, 2),
-                'support2': round(support2, 2),
-                'support3': round(support3, 2),
-                'resistance1': round(resistance1, 2),
-                'resistance2': round(resistance2, 2),
-                'resistance3': round(resistance3, 2)
-            }
+        return self.get_pivot(ohlc).get(type)
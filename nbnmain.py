@@ -1,12 +1,17 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
 from datetime import datetime
-from heapq import nsmallest
 import json
 import pathlib
 import re
 import sys
 import os
-from jugaad_data.nse import NSELive
-import nbndetails
+import threading
+import time
+import nbncache
+import nbnchain
+import nbncodec
+import nbnprofile
+import nbnstore
 
 
 class NiftyBankNifty:
@@ -14,20 +19,216 @@ class NiftyBankNifty:
 
     __nbn_message = None
     __jsonout_path = None
-    __nbndetails__ = nbndetails.NBNDetails()
+    __client = None
+    __cache = None
+    __chains = None
+    __output_method = None
+    __nbndetails__ = None
 
     indent_setting = 2
     '''indent setting for json output file'''
 
     output_format = 'std'
-
-    def __init__(self):
+    '''std to print the results, json to write them to a file, ndjson to append them to output_store,
+    none to only return them (e.g. when serving or replaying)'''
+
+    row_format = 'dict'
+    '''dict to return rows as lists of dicts, table to return them as nbntable tables from opt_chain,
+    live_fno and all_indices'''
+
+    output_store = None
+    '''store used by the ndjson output format, any object with append(method, message)'''
+
+    series_store = None
+    '''nbnseries.NBNSeries every fetched option chain is recorded into, None to not record'''
+
+    record_store = None
+    '''nbnstore.SegmentStore every response fetched from NSE is appended to under its endpoint name, None to not record'''
+
+    client_adapter = None
+    '''transport adapter mounted on the NSE client created by get_client, e.g. from nbntransport'''
+
+    clock = datetime.now
+    '''returns the current market time, replaced when replaying recorded sessions'''
+
+    chain_decoder = nbncodec.ChainDecoder()
+    '''decodes only the rows opt_chain keeps from the raw option chain'''
+
+    symbols = {
+        'NIFTY': 'NIFTY 50',
+        'BANKNIFTY': 'NIFTY BANK',
+        'FINNIFTY': 'NIFTY FINANCIAL SERVICES',
+        'MIDCPNIFTY': 'NIFTY MIDCAP SELECT',
+    }
+    '''supported underlyings and the index each one is quoted as by live_index'''
+
+    default_symbol = 'NIFTY'
+
+    roi = 0.07
+    '''rate of interest used for the greeks'''
+
+    greeks_cache = None
+    '''nbngreeks.GreeksCache chain_greeks reuses the greeks of unchanged legs from, created on first use'''
+
+    snapshot_endpoints = {
+        'marketOverview': 'market_status',
+        'allIndices': 'all_indices',
+        'optionChain': 'index_option_chain',
+        'liveFnOData': 'live_fno',
+        'derivativeTurnover': 'eq_derivative_turnover',
+    }
+    '''sections of the snapshot document and the endpoint each one is fetched from'''
+
+    def __init__(self, client=None, cache=None):
+        self.profiler = nbnprofile.NBNProfiler()
+        self.__client = client
+        self.__chains = {}
+        if hasattr(client, 'profiler'):
+            client.profiler = self.profiler
+        self.__client_lock = threading.Lock()
+        self.__greeks_lock = threading.Lock()
+        self.__cache = cache if cache is not None else nbncache.NBNCache()
         path = self.__get_data_file_path__('assets/data.json')
         with open(path, 'r', encoding='utf8') as file:
             data = json.load(file)
             self.__nbn_message = data['messages']
 
 
+    def get_client(self):
+        """
+        It returns the NSE client shared by all the calls of this instance, creating it on first use
+        so that the session, connection pool and cookies are reused
+        :return: The NSE client
+        """
+        with self.__client_lock:
+            if self.__client is None:
+                # imported here so that commands without network access skip loading requests and jugaad_data
+                import nbnclient
+                self.__client = nbnclient.NBNClient(adapter=self.client_adapter)
+                self.__client.profiler = self.profiler
+        return self.__client
+
+
+    def get_details(self):
+        """
+        It returns the NBNDetails used for pivots and expiries, creating it on first use
+        :return: The NBNDetails
+        """
+        if self.__nbndetails__ is None:
+            import nbndetails
+            self.__nbndetails__ = nbndetails.NBNDetails()
+        return self.__nbndetails__
+
+
+    def fetch(self, endpoint, *args):
+        """
+        It returns the response of an NSE endpoint through the cache, only creating the client and
+        calling NSE when there is no fresh cached response. The response is the cached object,
+        shared with every later call until it expires, so it must not be changed (see NBNCache)
+        :param endpoint: The name of the NBNClient method to call
+        :return: The decoded response
+        """
+        response = self.fetch_cached(endpoint, *args)
+        if isinstance(response, nbncodec.RawChain):
+            with self.profiler.span('decode'):
+                return response.state
+        return response
+
+    def fetch_cached(self, endpoint, *args):
+        """
+        It returns the response of an NSE endpoint as the cache holds it, a nbncodec.RawChain for an
+        option chain fetched undecoded, so that the decoded rows are kept with the cached response
+        :param endpoint: The name of the NBNClient method to call
+        :return: The cached response
+        """
+        with self.profiler.span('fetch'):
+            return self.__cache.get_or_fetch(endpoint, lambda *call_args: self.fetch_live(endpoint, *call_args), *args)
+
+    def symbol_args(self, endpoint, symbol=None):
+        """
+        It returns the arguments a per underlying endpoint (index_option_chain or live_index) is called
+        with for a symbol. The default symbol is fetched without arguments, as before symbols were supported
+        :param endpoint: The name of the NBNClient method to call
+        :param symbol: The underlying, one of symbols, None for the default
+        :return: The arguments
+        """
+        if symbol is None or symbol == self.default_symbol:
+            return ()
+        if symbol not in self.symbols:
+            raise ValueError(f'unsupported symbol {symbol}, use one of {", ".join(self.symbols)}')
+        return (self.symbols[symbol] if endpoint == 'live_index' else symbol,)
+
+    def fetch_symbol(self, endpoint, symbol=None):
+        """
+        It returns the response of a per underlying endpoint (index_option_chain or live_index) for a symbol
+        :param endpoint: The name of the NBNClient method to call
+        :param symbol: The underlying, one of symbols, None for the default
+        :return: The decoded response
+        """
+        return self.fetch(endpoint, *self.symbol_args(endpoint, symbol))
+
+    def fetch_live(self, endpoint, *args):
+        """
+        It calls the NSE endpoint on the shared client and records the response when a record_store is set.
+        The option chain is fetched undecoded when the client can, and returned as a nbncodec.RawChain
+        :param endpoint: The name of the NBNClient method to call
+        :return: The response
+        """
+        client = self.get_client()
+        response = None
+        if endpoint in nbncache.NBNCache.raw_endpoints and callable(getattr(client, endpoint + '_raw', None)):
+            raw = getattr(client, endpoint + '_raw')(*args)
+            if raw is not None:
+                response = nbncodec.RawChain(raw, self.chain_decoder)
+        if response is None:
+            response = getattr(client, endpoint)(*args)
+        if self.record_store is not None:
+            stream = '.'.join((endpoint,) + args)
+            if isinstance(response, nbncodec.RawChain) and '\n' not in response.text:
+                self.record_store.append_encoded(stream, response.text)
+            else:
+                self.record_store.append(stream, response.state if isinstance(response, nbncodec.RawChain) else response)
+        return response
+
+    def select_chain(self, limit, for_expiry=None, symbol=None):
+        """
+        It returns the rows opt_chain keeps for a limit: the filtered (nearest expiry) rows and the rows
+        of the month or given expiry around the underlying value. When the option chain was fetched
+        undecoded only those rows are decoded, once per fetched response
+        :param limit: The number of strikes on each side of the underlying value
+        :param for_expiry: The expiry to keep in place of the month expiry
+        :param symbol: The underlying, one of symbols, None for the default
+        :return: The option chain payload holding only those rows, or the whole payload
+        """
+        response = self.fetch_cached('index_option_chain', *self.symbol_args('index_option_chain', symbol))
+        if not isinstance(response, nbncodec.RawChain) or response.decoded is not None:
+            with self.profiler.span('decode'):
+                return response.state if isinstance(response, nbncodec.RawChain) else response
+
+        def select(header):
+            chain = nbnchain.OptionChain(header)
+            expiry = for_expiry or chain.month_expiry(chain.next_expiry(self.clock()))
+            return [expiry], chain.nearby_strikes(chain.underlying_value, 2 * limit)
+
+        with self.profiler.span('decode'):
+            # the month expiry only changes with the day
+            return response.select((limit, for_expiry, self.clock().date()), select)
+
+    def greeks_stats(self):
+        """
+        It returns how many option legs chain_greeks recomputed and reused from earlier snapshots
+        :return: The counters, empty before the first chain_greeks
+        """
+        return dict(self.greeks_cache.stats) if self.greeks_cache is not None else {}
+
+    def cache_stats(self):
+        """
+        It returns the hit, miss and eviction counters of the response cache
+        :return: The counters, overall and per endpoint
+        """
+        return self.__cache.stats
+
+
     def main(self):
         """
         Main() is a function that takes in a user input and calls other functions based on the user
@@ -61,7 +262,7 @@ class NiftyBankNifty:
         elif user_choice == '8':
             self.market_turnover()
         elif user_choice == '9':
-            print('not yet implemented. work in progress')
+            self.top_fno()
         else:
             print('select valid option')
         input('done')
@@ -71,8 +272,7 @@ class NiftyBankNifty:
         """
         It takes the current market status from the NSE website and writes it to a json file
         """
-        nse = NSELive()
-        state = nse.market_status()['marketState']
+        state = self.fetch('market_status')['marketState']
         nifty = next((item for item in state if item['market'] == 'Capital Market'), None)
         self.get_jsonfile_path()
         self.output_data(nifty)
@@ -82,78 +282,114 @@ class NiftyBankNifty:
         """
         It checks the market status and writes the output to a json file.
         """
-        nse = NSELive()
-        state = nse.market_status()['marketState']
+        state = self.fetch('market_status')['marketState']
         self.get_jsonfile_path()
         self.output_data(state)
         return state
 
 
-    def opt_chain(self, limit=-1, for_expiry = None):
+    def opt_chain(self, limit=-1, for_expiry = None, symbol=None):
         """
         It takes the data from the NSE website, filters it and outputs the data in a JSON format
         :param limit: The number of strike prices to be displayed
+        :param symbol: The underlying, one of symbols, None for the default
+        :return: The payload or rows, as a nbntable.ChainTable when row_format is table
         """
-        nse = NSELive()
-        state = nse.index_option_chain()
+        if 1 <= limit <= 100 and self.series_store is None:
+            state = self.select_chain(limit, for_expiry, symbol)
+        else:
+            state = self.fetch_symbol('index_option_chain', symbol)
+        if self.series_store is not None:
+            self.series_store.ingest(state, symbol=None if symbol == self.default_symbol else symbol)
         self.get_jsonfile_path()
         data = None
         if limit == -1:
             # print(json.dumps(state, indent=indent_setting))
-            data = state
+            data = self.as_table(state, 'chain')
             self.output_data(state)
         elif 1 <= limit <= 100:
-            # get the value
-            records = state["records"]
-            underlying_value = records["underlyingValue"]
-            all_expiry = records["expiryDates"]
-            latest_expiry = all_expiry[0]
-            # if today is the expiry, there are two scenario, one is called at morning, where delta would be valid, other is at evening when delta is invalid
-            if datetime.now().strftime('%d-%b-%Y') == latest_expiry:
-                # if datetime.strptime(latest_expiry + " 15-31","%d-%b-%Y %H-%M") > datetime.now():
-                latest_expiry = all_expiry[1]
-
-
-            latest_date = datetime.strptime(latest_expiry, '%d-%b-%Y')
-            latest_month_expiry = latest_expiry
-            month_expiry = [x for x in all_expiry if (datetime.strptime(x, '%d-%b-%Y').year == latest_date.year and datetime.strptime(x, '%d-%b-%Y').month == latest_date.month and datetime.strptime(x, '%d-%b-%Y').date != latest_date.date)]
-            if (month_expiry is not None and len(month_expiry) != 0):
-                latest_month_expiry = month_expiry[len(month_expiry) - 1]
-
-            # find nearest (n - 1) list of expiry
-            all_strikeprice = records["strikePrices"]
-            all_nearby_strikes = nsmallest(2*limit, all_strikeprice, key=lambda x: abs(x - underlying_value))
-            all_data = records["data"]
-
-            if for_expiry is None:
-                filtered = state["filtered"]["data"]
-                nearby_data = [item for item in filtered if item["strikePrice"] in all_nearby_strikes]
-                filtered_month_data = [item for item in all_data if item["strikePrice"] in all_nearby_strikes and item["expiryDate"] == latest_month_expiry]
-                filtered_all_data = nearby_data + filtered_month_data
-                self.output_data(filtered_all_data)
-                data = filtered_all_data
-            else:
-                filtered_date_data = [item for item in all_data if item["strikePrice"] in all_nearby_strikes and item["expiryDate"] == for_expiry]
-                self.output_data(filtered_date_data)
-                data = filtered_date_data
+            with self.profiler.span('compute'):
+                chain = self.get_chain(state, symbol)
+                latest_expiry = chain.next_expiry(self.clock())
+                latest_month_expiry = chain.month_expiry(latest_expiry)
+                # find nearest (n - 1) list of expiry
+                all_nearby_strikes = chain.nearby_strikes(chain.underlying_value, 2*limit)
+                if for_expiry is None:
+                    data = chain.filtered_rows(all_nearby_strikes) + chain.expiry_rows(latest_month_expiry, all_nearby_strikes)
+                else:
+                    data = chain.expiry_rows(for_expiry, all_nearby_strikes)
+            self.output_data(data)
+            data = self.as_table(data, 'rows')
 
         else:
             print('invalid value for limit')
         return data
 
 
+    def watch_chain(self, interval=3, ticks=None, symbol=None):
+        """
+        It polls the option chain every interval seconds and yields only the legs whose last price,
+        open interest, volume or implied volatility changed since the previous payload, together with
+        a compact summary. Polls that return the same (cached) payload yield nothing and the first
+        payload reports every leg
+        :param interval: The seconds between polls
+        :param ticks: The number of polls, None to poll forever
+        :param symbol: The underlying, one of symbols, None for the default
+        :return: A generator of diffs
+        """
+        previous = None
+        tick = 0
+        while ticks is None or tick < ticks:
+            started = time.monotonic()
+            state = self.fetch_symbol('index_option_chain', symbol)
+            if previous is None or state is not previous.state:
+                chain = self.get_chain(state, symbol)
+                yield chain.diff(previous)
+                previous = chain
+            tick += 1
+            if ticks is None or tick < ticks:
+                time.sleep(max(interval - (time.monotonic() - started), 0))
+
+
+    def watch_option_chain(self, interval=3, ticks=None, symbol=None):
+        """
+        It outputs every diff of watch_chain as it arrives
+        :param interval: The seconds between polls
+        :param ticks: The number of polls, None to poll forever
+        :param symbol: The underlying, one of symbols, None for the default
+        """
+        for diff in self.watch_chain(interval, ticks, symbol):
+            self.get_jsonfile_path()
+            self.output_data(diff)
+
+
+    def get_chain(self, state, symbol=None):
+        """
+        It returns the indexed OptionChain of an option chain payload, reusing the previous one of the
+        symbol while the payload (e.g. served from the cache) is the same object
+        :param state: The option chain payload
+        :param symbol: The underlying the payload belongs to
+        :return: The OptionChain
+        """
+        chain = self.__chains.get(symbol)
+        if chain is None or chain.state is not state:
+            chain = nbnchain.OptionChain(state)
+            self.__chains[symbol] = chain
+        return chain
+
+
     def all_indices(self, index=None):
         """
         It takes the data from the API and writes it to a JSON file
         :param index: The index name
+        :return: The payload, as a nbntable.ColumnTable when row_format is table, or the Nifty row
         """
-        nse = NSELive()
-        state = nse.all_indices()
+        state = self.fetch('all_indices')
         self.get_jsonfile_path()
         data = None
         if index != 'Nifty':
             self.output_data(state)
-            data = state
+            data = self.as_table(state, 'payload')
         else:
             data = state["data"]
             nifty = next((item for item in data if item["index"] == "NIFTY 50"), None)
@@ -169,21 +405,20 @@ class NiftyBankNifty:
         """
         It takes the data from the NSE website and stores it in a json file
         """
-        nse = NSELive()
         self.get_jsonfile_path()
-        state = nse.eq_derivative_turnover()
+        state = self.fetch('eq_derivative_turnover')
         self.output_data(state)
         return state
 
 
-    def live_index(self):
+    def live_index(self, symbol=None):
         """
         It takes the data from the live_index() function in the NSELive class and writes it to a json
         file
+        :param symbol: The underlying, one of symbols, None for the default
         """
-        nse = NSELive()
         self.get_jsonfile_path()
-        state = nse.live_index()
+        state = self.fetch_symbol('live_index', symbol)
         self.output_data(state)
         return state
 
@@ -191,36 +426,81 @@ class NiftyBankNifty:
     def live_fno(self):
         """
         It takes the data from the nse website and stores it in a json file
+        :return: The payload, as a nbntable.ColumnTable when row_format is table
         """
-        nse = NSELive()
-        state = nse.live_fno()
+        state = self.fetch('live_fno')
         self.get_jsonfile_path()
         self.output_data(state)
-        return state
+        return self.as_table(state, 'payload')
+
+    def as_table(self, data, shape):
+        """
+        It returns data as is when row_format is dict, else as a columnar table using far less memory
+        per row, which to_payload turns back into data
+        :param data: The payload or list of rows
+        :param shape: chain for an option chain payload, payload for a payload with a data list of rows,
+        rows for a list of option chain rows
+        :return: The data or its table
+        """
+        if self.row_format != 'table':
+            return data
+        import nbntable
+        if shape == 'chain':
+            return nbntable.ChainTable.from_payload(data)
+        if shape == 'rows':
+            return nbntable.ChainTable.from_rows(data)
+        return nbntable.ColumnTable.from_payload(data)
 
 
     def market_turnover(self):
         """
         It takes the data from the nse.market_turnover() function and writes it to a json file
         """
-        nse = NSELive()
-        state = nse.market_turnover()
+        state = self.fetch('market_turnover')
         self.get_jsonfile_path()
         self.output_data(state)
         return state
 
-    def get_ohlc(self):
+    def snapshot(self, timeout=10):
+        """
+        It fetches the market overview, all indices, option chain, live fno data and derivative
+        turnover concurrently and writes them as one document. An endpoint that fails or does not
+        answer within the timeout is left as None and its error is reported under 'errors'
+        :param timeout: The seconds to wait for all the endpoints
+        :return: The combined document
+        """
+        self.get_jsonfile_path()
+        executor = ThreadPoolExecutor(max_workers=len(self.snapshot_endpoints))
+        futures = {name: executor.submit(self.fetch, endpoint) for name, endpoint in self.snapshot_endpoints.items()}
+        wait(futures.values(), timeout=timeout)
+        executor.shutdown(wait=False, cancel_futures=True)
+        data = {'timestamp': self.clock().strftime('%d-%b-%Y %H:%M:%S'), 'errors': {}}
+        for name, future in futures.items():
+            data[name] = None
+            if not future.done():
+                data['errors'][name] = f'timed out after {timeout}s'
+            elif future.exception() is not None:
+                data['errors'][name] = repr(future.exception())
+            else:
+                data[name] = future.result()
+        self.output_data(data)
+        return data
+
+    def get_ohlc(self, symbol=None):
         """retuns the OHLC of Nifty
 
+        Args:
+            symbol (str, optional): underlying, one of symbols. Defaults to the default symbol.
+
         Returns:
             object: ohlc value
-        """        
+        """
         # status = self.current_status()
         # if (status is not None):
         #     print (1)
         # Todo: Get from other API
         # ToDo: Regex escape in JSON from "Dr Reddy's Lab"
-        idx = self.live_index()
+        idx = self.live_index(symbol)
         if idx is not None:
             # ToDo: check with Data without 0 why next of list expansion is not working
             nifty = idx['data'][0]
@@ -252,12 +532,39 @@ class NiftyBankNifty:
         :return: The return value is a list of dictionaries.
         """
         local_args = sys.argv
+        cache_args = [arg for arg in local_args if arg == '--cache' or arg.startswith('--cache=')]
+        if cache_args:
+            # responses are kept on disk so that repeated invocations within the ttl skip the network
+            local_args = [arg for arg in local_args if arg not in cache_args]
+            cache_path = cache_args[-1][len('--cache='):] or os.path.join(os.getcwd(), 'cache')
+            self.__cache.disk_path = cache_path
+        profile_args = [arg for arg in local_args if arg == '--profile' or arg.startswith('--profile=')]
+        if profile_args:
+            local_args = [arg for arg in local_args if arg not in profile_args]
+            self.profiler.enabled = True
+        for arg in [arg for arg in local_args if arg.startswith(('--record=', '--replay='))]:
+            # responses are recorded from, or replayed without network to, the NSE client
+            local_args = [other for other in local_args if other != arg]
+            import nbntransport
+            cassette = nbntransport.Cassette(arg.split('=', 1)[1])
+            if arg.startswith('--record='):
+                self.client_adapter = nbntransport.RecordingAdapter(cassette)
+            else:
+                self.client_adapter = nbntransport.ReplayAdapter(cassette)
+        if '-ndjson' in local_args:
+            local_args = [arg for arg in local_args if arg != '-ndjson']
+            self.output_format = 'ndjson'
+        symbol = None
+        for arg in [arg for arg in local_args if arg.startswith('--symbol=')]:
+            local_args = [other for other in local_args if other != arg]
+            symbol = arg[len('--symbol='):].upper()
 
         if len(local_args) < 2:
             print(self.__nbn_message['GenericStartMessage'])
             input()
             return
 
+        started = time.perf_counter()
         first_arg = local_args[1]
         second_arg = None
         if len(local_args) >= 3:
@@ -276,7 +583,7 @@ class NiftyBankNifty:
             self.main_market_data()
         elif first_arg == '-optionChain':
             if (second_arg is None or second_arg == '-json'):
-                self.opt_chain()
+                self.opt_chain(symbol=symbol)
             elif second_arg.startswith("--limit="):  # and re.match("--limit=\d+") is not None):
                 match = re.match("--limit=(\d+)", second_arg)
                 if (match is not None and match.groups() is not None):
@@ -284,7 +591,7 @@ class NiftyBankNifty:
                     if len(local_args) >= 4:
                         if local_args[3] == '-json':
                             self.output_format = 'json'
-                    self.opt_chain(limit=int(limit))
+                    self.opt_chain(limit=int(limit), symbol=symbol)
         elif first_arg == '-nifyDetails':
             self.all_indices('Nifty')
         elif first_arg == '-allIndices':
@@ -292,23 +599,114 @@ class NiftyBankNifty:
         elif first_arg == '-derivativeTurnover':
             self.derivate_turnover()
         elif first_arg == '-liveData':
-            self.live_index()
+            self.live_index(symbol)
         elif first_arg == '-liveFnOData':
             self.live_fno()
         elif first_arg == '-marketTurnover':
             self.market_turnover()
         elif first_arg == '-topFnO':
-            if (len(local_args) >= 3 and local_args[2] == '-json'):
-                self.output_format = 'json'
-            self.opt_chain(5)
+            metrics = None
+            top = 5
+            for arg in local_args[2:]:
+                if arg.startswith('--metrics='):
+                    metrics = arg[len('--metrics='):].split(',')
+                elif arg.startswith('--top='):
+                    top = int(arg[len('--top='):])
+                elif arg == '-json':
+                    self.output_format = 'json'
+            self.top_fno(symbol, metrics, top)
+        elif first_arg == '-watchOptionChain':
+            interval = 3
+            if second_arg is not None and second_arg.startswith('--interval='):
+                interval = float(second_arg[len('--interval='):])
+                if len(local_args) >= 4 and local_args[3] == '-json':
+                    self.output_format = 'json'
+            self.watch_option_chain(interval, symbol=symbol)
+        elif first_arg == '-serve':
+            import nbnserve
+            port = 8080
+            if second_arg is not None and second_arg.startswith('--port='):
+                port = int(second_arg[len('--port='):])
+            nbnserve.NBNServer(self, port=port).run()
+        elif first_arg == '-refreshHolidays':
+            import nbncalendar
+            holidays = nbncalendar.refresh_holidays(self.get_client())
+            self.output_data([day.strftime('%d-%b-%Y') for day in holidays])
+        elif first_arg == '-snapshot':
+            self.snapshot()
         elif first_arg == '-supportAndResistence':
             if (len(local_args) >= 3 and local_args[2] == '-json'):
                 self.output_format = 'json'
-            self.get_pivot()
+            self.get_pivot(symbol)
+        elif first_arg == '-chainGreeks':
+            self.chain_greeks(symbol)
+        elif first_arg == '-chainAnalytics':
+            expiry = None
+            for arg in local_args[2:]:
+                if arg.startswith('--expiry='):
+                    expiry = arg[len('--expiry='):]
+                elif arg == '-json':
+                    self.output_format = 'json'
+            self.chain_analytics(symbol, expiry)
+        elif first_arg == '-scenario':
+            picks = []
+            options = {}
+            for arg in local_args[2:]:
+                if arg.startswith('--legs='):
+                    for leg in arg[len('--legs='):].split(','):
+                        expiry, strike, kind, quantity = leg.split(':')
+                        picks.append((expiry, float(strike), kind.upper(), float(quantity)))
+                elif arg.startswith(('--spot=', '--vol=', '--days=')):
+                    name, value = arg[2:].split('=', 1)
+                    options[{'spot': 'spot_range', 'vol': 'vol_range', 'days': 'days'}[name]] = int(value) if name == 'days' else float(value)
+                elif arg == '-json':
+                    self.output_format = 'json'
+            self.scenario(picks, symbol, **options)
+        elif first_arg == '-screen':
+            options = {}
+            names = {'--strategy=': ('strategy', str), '--expiry=': ('expiry', str), '--top=': ('top', int),
+                     '--rank=': ('rank', str), '--budget=': ('budget', float), '--processes=': ('processes', int),
+                     '--width=': ('max_width', float), '--credit=': ('min_credit', float),
+                     '--delta=': ('max_delta', float), '--shortDelta=': ('short_delta', float)}
+            for arg in local_args[2:]:
+                if arg == '-json':
+                    self.output_format = 'json'
+                elif '=' in arg and arg[:arg.index('=') + 1] in names:
+                    name, kind = names[arg[:arg.index('=') + 1]]
+                    options[name] = kind(arg[arg.index('=') + 1:])
+            self.screen_strategies(options.pop('strategy', 'ironCondor'), symbol, **options)
+        elif first_arg == '-multiSymbol':
+            symbols = None
+            processes = None
+            for arg in local_args[2:]:
+                if arg.startswith('--symbols='):
+                    symbols = arg[len('--symbols='):].upper().split(',')
+                elif arg.startswith('--processes='):
+                    processes = int(arg[len('--processes='):])
+                elif arg == '-json':
+                    self.output_format = 'json'
+            self.multi_symbol(symbols, processes=processes)
         else:
             print('invalid option')
+        if profile_args:
+            self.profiler.record('total', time.perf_counter() - started)
+            self.output_profile(profile_args[-1][len('--profile='):] or None)
 
 
+    def output_profile(self, path=None):
+        """
+        It prints the per phase latency breakdown to stderr and writes it as json when a path is given
+        :param path: The json file to write, None to only print
+        :return: The breakdown
+        """
+        report = self.profiler.report()
+        for phase, stats in report.items():
+            print(f"{phase:10} {stats['count']:>6} calls {stats['total_ms']:>12.3f} ms total {stats['mean_ms']:>10.3f} ms mean {stats['max_ms']:>10.3f} ms max", file=sys.stderr)
+        if path is not None:
+            with open(path, 'w', encoding='utf8') as file:
+                file.write(json.dumps(report, indent=self.indent_setting))
+        return report
+
     def get_jsonfile_path(self):
         """
         It returns the path of the json file to be created
@@ -319,21 +717,33 @@ class NiftyBankNifty:
         current_time = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
         path = os.path.join(cwd, 'output', method_name, current_time + '.json')
         self.__jsonout_path = path
+        self.__output_method = method_name
         return path
 
     def output_data(self, message):
         """
         If the output_format is 'std', print the message. If the output_format is 'json', create a
-        directory if it doesn't exist, and write the message to a file.
+        directory if it doesn't exist, and write the message to a file. If the output_format is
+        'ndjson', append the message to the segmented log of the method in the output store. If the
+        output_format is 'none', do nothing, the caller uses the returned data
         :param message: The message to be outputted
         """
-        if self.output_format == 'std':
-            print(message)
-        elif self.output_format == 'json':
-            pathlib.Path(os.path.dirname(self.__jsonout_path)).mkdir(parents=True, exist_ok=True)
-            with open(self.__jsonout_path, "w", encoding='utf8') as file1:
-                # Writing data to a file
-                file1.write(json.dumps(message, indent=self.indent_setting))
+        if self.output_format == 'none':
+            return
+        if self.output_format not in ('std', 'json', 'ndjson'):
+            raise ValueError(f'unknown output format {self.output_format}, use std, json, ndjson or none')
+        with self.profiler.span('output'):
+            if self.output_format == 'std':
+                print(message)
+            elif self.output_format == 'json':
+                pathlib.Path(os.path.dirname(self.__jsonout_path)).mkdir(parents=True, exist_ok=True)
+                with open(self.__jsonout_path, "w", encoding='utf8') as file1:
+                    # Writing data to a file
+                    file1.write(json.dumps(message, indent=self.indent_setting))
+            elif self.output_format == 'ndjson':
+                if self.output_store is None:
+                    self.output_store = nbnstore.SegmentStore(os.path.join(os.getcwd(), 'output'))
+                self.output_store.append(self.__output_method, message)
 
     def __get_data_file_path__(self, relative_path):
         """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -345,21 +755,218 @@ class NiftyBankNifty:
 
         return os.path.join(base_path, relative_path)
 
-    def get_pivot(self):
+    def get_pivot(self, symbol=None):
         """Returns the pivot point
 
+        Args:
+            symbol (str, optional): underlying, one of symbols. Defaults to the default symbol.
+
         Returns:
             object: pivots
-        """        
-        ohlc = self.get_ohlc()
-        pivots = self.__nbndetails__.get_pivot(ohlc)
+        """
+        ohlc = self.get_ohlc(symbol)
+        with self.profiler.span('compute'):
+            pivots = self.get_details().get_pivot(ohlc)
         self.output_data(pivots)
         return pivots
 
-    def get_all_expiry(self):
-        nse = NSELive()
-        state = nse.index_option_chain()
+    def chain_greeks(self, symbol=None):
+        """
+        It computes the greeks of every call and put of the option chain, using the implied
+        volatility NSE reports, and writes them to a json file
+        :param symbol: The underlying, one of symbols, None for the default
+        :return: The strikes, expiries and CE/PE greeks as lists
+        """
+        import nbngreeks
+        state = self.fetch_symbol('index_option_chain', symbol)
+        self.get_jsonfile_path()
+        with self.profiler.span('compute'), self.__greeks_lock:
+            if self.greeks_cache is None:
+                self.greeks_cache = nbngreeks.GreeksCache(self.roi)
+            data = greeks_lists(self.greeks_cache.update(state, symbol or self.default_symbol, self.clock()))
+        self.output_data(data)
+        return data
+
+    def scenario(self, picks, symbol=None, spot_range=3, vol_range=2, days=None, spot_steps=61, vol_steps=9):
+        """
+        It values a multi-leg position priced from the option chain over a grid of underlying moves,
+        implied volatility changes and days elapsed, and writes its value, P&L and greeks to a json file
+        :param picks: The (expiryDate, strikePrice, CE or PE, quantity) of each leg, quantity negative when sold
+        :param symbol: The underlying, one of symbols, None for the default
+        :param spot_range: The largest underlying move in percent, both ways
+        :param vol_range: The largest implied volatility change in points, both ways
+        :param days: The largest number of days elapsed, None for up to the nearest leg expiry
+        :param spot_steps: The number of underlying moves in the grid
+        :param vol_steps: The number of implied volatility changes in the grid
+        :return: The grid axes and the value, pnl and greeks per grid point as nested lists
+        """
+        import numpy
+        import nbnscenario
+        state = self.fetch_symbol('index_option_chain', symbol)
+        self.get_jsonfile_path()
+        with self.profiler.span('compute'):
+            legs = nbnscenario.legs_from_chain(state, picks)
+            position = nbnscenario.NBNScenario(legs, state['records']['underlyingValue'], self.roi, self.clock())
+            if days is None:
+                days = int(numpy.ceil(position.time.min() * 365)) if legs else 0
+            grid = position.grid(numpy.linspace(-spot_range, spot_range, spot_steps) / 100,
+                                 numpy.linspace(-vol_range, vol_range, vol_steps), numpy.arange(days + 1))
+            data = {'legs': legs}
+            data.update({name: values.tolist() for name, values in grid.items()})
+        self.output_data(data)
+        return data
+
+    def screen_strategies(self, strategy, symbol=None, expiry=None, top=10, rank='pop', budget=None, processes=None,
+                          **constraints):
+        """
+        It ranks the combinations of a multi-leg strategy (straddle, strangle, iron condor, bull call or
+        bear put spread) over the strikes of one expiry and writes the top ones to a json file
+        :param strategy: The strategy name, one of nbnscreener.StrategyScreener.strategies
+        :param symbol: The underlying, one of symbols, None for the default
+        :param expiry: The expiry date, None for the next expiry
+        :param top: The number of combinations returned
+        :param rank: The measure ranked by, pop, maxProfit or rewardRisk
+        :param budget: The seconds to spend screening, None for no limit
+        :param processes: The worker processes, None to screen in this process
+        :param constraints: The max_width, min_credit, max_delta and short_delta pruning the combinations
+        :return: The top combinations with their premium, max profit and loss, breakevens, pop and greeks
+        """
+        import nbnscreener
+        state = self.fetch_symbol('index_option_chain', symbol)
+        self.get_jsonfile_path()
+        with self.profiler.span('compute'):
+            screener = nbnscreener.StrategyScreener(state, expiry, self.roi, self.clock())
+            data = screener.screen(strategy, top, rank, budget=budget, processes=processes, **constraints)
+        self.output_data(data)
+        return data
+
+    def top_fno(self, symbol=None, metrics=None, top=5):
+        """
+        It ranks the calls and puts of every expiry of the option chain by open interest, change in
+        open interest, volume, implied volatility and turnover, and writes the top ones to a json file
+        :param symbol: The underlying, one of symbols, None for the default
+        :param metrics: The metric names to rank by, None for all of them
+        :param top: The number of calls and of puts kept per metric
+        :return: The top calls and puts per metric
+        """
+        import nbnanalytics
+        ranking = nbnanalytics.TopOptions(metrics, top)
+        state = self.fetch_symbol('index_option_chain', symbol)
+        self.get_jsonfile_path()
+        with self.profiler.span('compute'):
+            data = ranking.rank(state)
+        self.output_data(data)
+        return data
+
+    def chain_analytics(self, symbol=None, expiry=None, top=5):
+        """
+        It computes the put/call ratio, max pain, open interest change leaders and implied volatility
+        skew of the option chain, per expiry, and writes them to a json file
+        :param symbol: The underlying, one of symbols, None for the default
+        :param expiry: The expiry date to analyse, None for every expiry
+        :param top: The number of strikes in each open interest change list
+        :return: The analytics
+        """
+        import nbnanalytics
+        state = self.fetch_symbol('index_option_chain', symbol)
+        self.get_jsonfile_path()
+        with self.profiler.span('compute'):
+            data = nbnanalytics.ChainAnalytics(state).analyse(None if expiry is None else [expiry], top)
+        self.output_data(data)
+        return data
+
+    def multi_symbol(self, symbols=None, limit=10, processes=None):
+        """
+        It fetches the option chain and live index of several underlyings concurrently, then computes
+        the nearby strikes, greeks and pivots of each one in a worker pool
+        :param symbols: The underlyings, None for all of symbols
+        :param limit: The number of strikes around the underlying value kept per side
+        :param processes: The worker processes for the computation, None to compute on threads
+        :return: The result of each symbol, or its error
+        """
+        symbols = symbols or list(self.symbols)
+        self.get_jsonfile_path()
+        with ThreadPoolExecutor(max_workers=2 * len(symbols)) as fetch_pool:
+            chains = {symbol: fetch_pool.submit(self.fetch_symbol, 'index_option_chain', symbol) for symbol in symbols}
+            indices = {symbol: fetch_pool.submit(self.fetch_symbol, 'live_index', symbol) for symbol in symbols}
+            wait(list(chains.values()) + list(indices.values()))
+        compute_pool = ProcessPoolExecutor(max_workers=processes) if processes else ThreadPoolExecutor(max_workers=len(symbols))
+        data = {}
+        with compute_pool, self.profiler.span('compute'):
+            jobs = {}
+            for symbol in symbols:
+                error = chains[symbol].exception() or indices[symbol].exception()
+                if error is not None:
+                    data[symbol] = {'error': repr(error)}
+                else:
+                    jobs[symbol] = compute_pool.submit(analyse_symbol, chains[symbol].result(), indices[symbol].result(),
+                                                       limit, self.roi, self.clock())
+            for symbol, job in jobs.items():
+                try:
+                    data[symbol] = job.result()
+                except Exception as error:
+                    data[symbol] = {'error': repr(error)}
+        data = {symbol: data[symbol] for symbol in symbols}
+        self.output_data(data)
+        return data
+
+    def get_all_expiry(self, symbol=None):
+        state = self.fetch_cached('index_option_chain', *self.symbol_args('index_option_chain', symbol))
+        if isinstance(state, nbncodec.RawChain):
+            with self.profiler.span('decode'):
+                state = state.header()
         records = state["records"]
         all_expiry = records["expiryDates"]
         self.output_data(all_expiry)
         return all_expiry
+
+
+def option_chain_greeks(chain, roi, now):
+    """
+    It returns the greeks of every call and put of an option chain payload (or list of rows) as lists
+    :param chain: The option chain payload or its rows
+    :param roi: The rate of interest
+    :param now: The time to measure expiry from
+    :return: The strikes, expiries and CE/PE greeks
+    """
+    import nbngreeks
+    return greeks_lists(nbngreeks.NBNGreeks().option_chain_greeks(chain, roi, now))
+
+
+def greeks_lists(greeks):
+    """
+    It returns the arrays of an option chain greeks table as lists
+    :param greeks: The table, as returned by NBNGreeks.option_chain_greeks or GreeksCache.update
+    :return: The table with lists in place of arrays
+    """
+    return {
+        'strikePrice': greeks['strikePrice'].tolist(),
+        'expiryDate': greeks['expiryDate'],
+        'CE': {name: values.tolist() for name, values in greeks['CE'].items()},
+        'PE': {name: values.tolist() for name, values in greeks['PE'].items()},
+    }
+
+
+def analyse_symbol(state, index, limit, roi, now):
+    """
+    It computes the nearest expiry rows around the underlying value, their greeks and the pivots of one
+    underlying. Kept at module level so that it can run in a worker process
+    :param state: The option chain payload
+    :param index: The live index payload of the underlying
+    :param limit: The number of strikes around the underlying value kept per side
+    :param roi: The rate of interest
+    :param now: The current market time
+    :return: The underlying value, rows, greeks and pivots
+    """
+    import nbndetails
+    chain = nbnchain.OptionChain(state)
+    strikes = chain.nearby_strikes(chain.underlying_value, 2 * limit)
+    rows = chain.expiry_rows(chain.next_expiry(now), strikes)
+    quote = index['data'][0]
+    ohlc = {'o': quote['open'], 'h': quote['dayHigh'], 'l': quote['dayLow'], 'c': quote['lastPrice']}
+    return {
+        'underlyingValue': chain.underlying_value,
+        'optionChain': rows,
+        'greeks': option_chain_greeks(rows, roi, now) if rows else None,
+        'pivots': nbndetails.NBNDetails().get_pivot(ohlc),
+    }
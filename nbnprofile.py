@@ -0,0 +1,91 @@
+from bisect import bisect_left
+from contextlib import nullcontext
+import threading
+import time
+
+
+class Span:
+    '''Times one phase and records it in the profiler on exit'''
+
+    __slots__ = ('profiler', 'phase', 'start')
+
+    def __init__(self, profiler, phase: str):
+        self.profiler = profiler
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.phase, time.perf_counter() - self.start)
+        return False
+
+
+class NBNProfiler:
+    '''Per phase latency counters and histograms, close to free when disabled'''
+
+    buckets_ms = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+    '''upper bounds of the latency histogram buckets in milliseconds, the last bucket is unbounded'''
+
+    disabled_span = nullcontext()
+
+    def __init__(self, enabled: bool = False):
+        """creates the profiler
+
+        Args:
+            enabled (bool, optional): record spans. Defaults to False.
+        """
+        self.enabled = enabled
+        self.__lock = threading.Lock()
+        self.phases = {}
+
+    def span(self, phase: str):
+        """returns a context manager timing a phase, e.g. with profiler.span('fetch'):
+
+        Args:
+            phase (str): name of the phase
+
+        Returns:
+            object: the context manager
+        """
+        if not self.enabled:
+            return self.disabled_span
+        return Span(self, phase)
+
+    def record(self, phase: str, seconds: float):
+        """adds one measurement of a phase"""
+        milliseconds = seconds * 1000
+        with self.__lock:
+            stats = self.phases.get(phase)
+            if stats is None:
+                stats = self.phases[phase] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                              'histogram': [0] * (len(self.buckets_ms) + 1)}
+            stats['count'] += 1
+            stats['total_ms'] += milliseconds
+            stats['max_ms'] = max(stats['max_ms'], milliseconds)
+            stats['histogram'][bisect_left(self.buckets_ms, milliseconds)] += 1
+
+    def report(self):
+        """returns count, total, mean, max and histogram per phase
+
+        Returns:
+            dict: statistics per phase, histogram keyed by bucket upper bound in ms
+        """
+        with self.__lock:
+            report = {}
+            for phase, stats in self.phases.items():
+                labels = [f'<={bound}' for bound in self.buckets_ms] + [f'>{self.buckets_ms[-1]}']
+                report[phase] = {
+                    'count': stats['count'],
+                    'total_ms': round(stats['total_ms'], 3),
+                    'mean_ms': round(stats['total_ms'] / stats['count'], 3),
+                    'max_ms': round(stats['max_ms'], 3),
+                    'histogram': {label: count for label, count in zip(labels, stats['histogram']) if count},
+                }
+            return report
+
+    def reset(self):
+        """drops every measurement"""
+        with self.__lock:
+            self.phases = {}
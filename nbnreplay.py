@@ -0,0 +1,165 @@
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+import nbncache
+import nbnmain
+import nbnstore
+
+
+class ReplayCache(nbncache.NBNCache):
+    '''Cache that never serves a response, every call reads the snapshot of the replay time'''
+
+    def get_or_fetch(self, endpoint: str, fetch, *args):
+        return fetch(*args)
+
+
+class ReplayClient:
+    '''Stand-in for the NSE client that answers with the recorded snapshot at the replay time'''
+
+    def __init__(self, store: nbnstore.SegmentStore, day: date, endpoints: list):
+        """loads the index of the recorded endpoints for a day
+
+        Args:
+            store (nbnstore.SegmentStore): store the session was recorded into
+            day (date): trading day to replay
+            endpoints (list): streams to replay, endpoint names followed by '.' and the argument for calls made with one
+        """
+        self.store = store
+        self.now = None
+        self.__first = datetime.combine(day, datetime.min.time()).isoformat(timespec='microseconds')
+        self.__last = (datetime.combine(day, datetime.min.time()) + timedelta(days=1)).isoformat(timespec='microseconds')
+        self.entries = {}
+        for endpoint in endpoints:
+            self.load(endpoint)
+        self.__position = {}
+        self.__decoded = {}
+
+    def load(self, stream: str):
+        """returns the index entries of a recorded stream for the day, loading them on first use
+
+        Args:
+            stream (str): endpoint name, followed by '.' and the argument for calls made with one
+
+        Returns:
+            list: index entries in time order
+        """
+        if stream not in self.entries:
+            index = self.store.index(stream)
+            keys = [entry[0] for entry in index]
+            self.entries[stream] = index[bisect_left(keys, self.__first):bisect_left(keys, self.__last)]
+        return self.entries[stream]
+
+    def ticks(self):
+        """returns the sorted times at which any of the endpoints has a snapshot"""
+        return sorted({datetime.fromisoformat(entry[0]) for entries in self.entries.values() for entry in entries})
+
+    def snapshot(self, endpoint: str):
+        """returns the latest snapshot of an endpoint at or before the replay time, decoding it once"""
+        entries = self.load(endpoint)
+        now = self.now.isoformat(timespec='microseconds')
+        position = self.__position.get(endpoint, -1)
+        if position >= 0 and entries[position][0] > now:
+            position = -1
+        while position + 1 < len(entries) and entries[position + 1][0] <= now:
+            position += 1
+        self.__position[endpoint] = position
+        if position < 0:
+            raise LookupError(f'no {endpoint} snapshot recorded at or before {now}')
+        entry = entries[position]
+        if self.__decoded.get(endpoint, (None,))[0] != entry:
+            self.__decoded[endpoint] = (entry, self.store.read(endpoint, entry))
+        return self.__decoded[endpoint][1]
+
+    def market_status(self):
+        return self.snapshot('market_status')
+
+    def all_indices(self):
+        return self.snapshot('all_indices')
+
+    def live_index(self, symbol: str = None):
+        return self.snapshot('live_index' if symbol is None else 'live_index.' + symbol)
+
+    def live_fno(self):
+        return self.snapshot('live_fno')
+
+    def eq_derivative_turnover(self):
+        return self.snapshot('eq_derivative_turnover')
+
+    def market_turnover(self):
+        return self.snapshot('market_turnover')
+
+    def index_option_chain(self, symbol: str = None):
+        return self.snapshot('index_option_chain' if symbol is None else 'index_option_chain.' + symbol)
+
+
+class NBNReplay:
+    '''Replays recorded sessions through NiftyBankNifty, day by day and in parallel'''
+
+    endpoints = ('market_status', 'all_indices', 'live_index', 'live_fno', 'eq_derivative_turnover',
+                 'market_turnover', 'index_option_chain')
+    '''endpoint names looked up in the store'''
+
+    def __init__(self, path: str):
+        """opens a recorded session store
+
+        Args:
+            path (str): folder of the nbnstore.SegmentStore the sessions were recorded into,
+                e.g. with NiftyBankNifty.record_store
+        """
+        self.path = path
+        self.store = nbnstore.SegmentStore(path)
+
+    def streams(self):
+        """returns the recorded streams of the endpoints, with those of other symbols such as index_option_chain.BANKNIFTY"""
+        return [stream for stream in self.store.methods() if stream.split('.', 1)[0] in self.endpoints]
+
+    def days(self):
+        """returns the trading days that have recorded snapshots"""
+        return sorted({datetime.fromisoformat(entry[0]).date()
+                       for stream in self.streams() for entry in self.store.index(stream)})
+
+    def run_day(self, day: date, strategy):
+        """replays one day, calling the strategy on every tick
+
+        Args:
+            day (date): trading day
+            strategy (callable): called as strategy(nbn, now) with a NiftyBankNifty wired to the
+                recorded snapshots at time now; its non None return values are collected
+
+        Returns:
+            object: day, number of ticks and the collected strategy results
+        """
+        client = ReplayClient(self.store, day, self.streams())
+        nbn = nbnmain.NiftyBankNifty(client=client, cache=ReplayCache())
+        nbn.output_format = 'none'
+        nbn.clock = lambda: client.now
+        results = []
+        ticks = client.ticks()
+        for now in ticks:
+            client.now = now
+            result = strategy(nbn, now)
+            if result is not None:
+                results.append(result)
+        return {'day': day.isoformat(), 'ticks': len(ticks), 'results': results}
+
+    def run(self, strategy, days: list = None, processes: int = None):
+        """replays several days in parallel across processes
+
+        Args:
+            strategy (callable): module level function called as strategy(nbn, now), see run_day
+            days (list, optional): trading days to replay. Defaults to every recorded day.
+            processes (int, optional): worker processes, 1 to replay in this process. Defaults to the cpu count.
+
+        Returns:
+            list: run_day result per day, in day order
+        """
+        days = self.days() if days is None else days
+        if processes == 1 or len(days) <= 1:
+            return [self.run_day(day, strategy) for day in days]
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return list(executor.map(replay_day, [self.path] * len(days), days, [strategy] * len(days)))
+
+
+def replay_day(path: str, day: date, strategy):
+    """replays one day of the store at path, used by the worker processes of NBNReplay.run"""
+    return NBNReplay(path).run_day(day, strategy)
@@ -0,0 +1,98 @@
+from datetime import datetime
+import numpy
+import nbnchain
+import nbngreeks
+
+
+class NBNScenario:
+    '''Price, P&L and greeks of a multi-leg option position over a spot x volatility x days grid
+
+    Legs are laid on the last axis and the grid on the first three, so the whole grid is one
+    broadcast call to NBNGreeks.chain_valuation, summed over the legs by a matrix product.
+    '''
+
+    names = ('delta', 'gamma', 'theta', 'vega', 'rho')
+    '''position greeks returned for every grid point'''
+
+    def __init__(self, legs: list, spot: float, roi: float, now: datetime = None, greeks: nbngreeks.NBNGreeks = None):
+        """sets the position and the market it is valued from
+
+        Args:
+            legs (list): dicts with expiryDate, strikePrice, type (CE or PE), quantity (negative when
+                sold), impliedVolatility in percent and price paid per unit, e.g. from legs_from_chain
+            spot (float): current underlying value
+            roi (float): rate of interest
+            now (datetime, optional): time the position is valued at. Defaults to current time.
+            greeks (nbngreeks.NBNGreeks, optional): greeks calculator. Defaults to a new NBNGreeks.
+        """
+        self.greeks = greeks or nbngreeks.NBNGreeks()
+        self.legs = legs
+        self.spot = spot
+        self.roi = roi
+        self.now = now or datetime.now()
+        self.strike = numpy.asarray([leg['strikePrice'] for leg in legs], dtype=numpy.float64)
+        self.is_call = numpy.asarray([leg['type'] == 'CE' for leg in legs])
+        self.quantity = numpy.asarray([leg['quantity'] for leg in legs], dtype=numpy.float64)
+        self.sigma = numpy.asarray([leg['impliedVolatility'] for leg in legs], dtype=numpy.float64) / 100
+        self.price = numpy.asarray([leg['price'] for leg in legs], dtype=numpy.float64)
+        self.time = self.greeks.time_to_expiry([leg['expiryDate'] for leg in legs], self.now)
+
+    def grid(self, spot_moves, vol_shifts, days):
+        """returns the position value, P&L and greeks at every point of the grid
+
+        Legs that expire within the elapsed days are valued at intrinsic value with no greeks.
+
+        Args:
+            spot_moves (array_like): relative moves of the underlying, e.g. 0.03 for +3%
+            vol_shifts (array_like): implied volatility changes in points, e.g. 2 for +2%
+            days (array_like): calendar days elapsed
+
+        Returns:
+            dict: the spot, volShift and days axes, and value, pnl, delta, gamma, theta, vega and rho
+                arrays of shape (spots, vol shifts, days)
+        """
+        spot_moves = numpy.asarray(spot_moves, dtype=numpy.float64)
+        vol_shifts = numpy.asarray(vol_shifts, dtype=numpy.float64)
+        days = numpy.asarray(days, dtype=numpy.float64)
+        spot = (self.spot * (1 + spot_moves))[:, None, None, None]
+        sigma = numpy.maximum(self.sigma + vol_shifts[:, None] / 100, 0)[None, :, None, :]
+        time = numpy.maximum(self.time - days[:, None] / 365, 0)[None, None, :, :]
+        legs = self.greeks.chain_valuation(spot, self.strike, time, self.roi, sigma, self.is_call)
+        result = {
+            'spot': spot[:, 0, 0, 0],
+            'volShift': vol_shifts,
+            'days': days,
+            'value': legs['price'] @ self.quantity,
+            'pnl': (legs['price'] - self.price) @ self.quantity,
+        }
+        for name in self.names:
+            result[name] = legs[name] @ self.quantity
+        return result
+
+
+def legs_from_chain(state, picks: list):
+    """returns scenario legs priced from an option chain payload
+
+    Args:
+        state (object): option chain payload as returned by index_option_chain
+        picks (list): (expiryDate, strikePrice, CE or PE, quantity) per leg, quantity negative when sold
+
+    Returns:
+        list: legs with the last price as the price paid and the reported implied volatility
+    """
+    chain = nbnchain.OptionChain(state)
+    legs = []
+    for expiry, strike, kind, quantity in picks:
+        rows = chain.expiry_rows(expiry, [strike])
+        quote = rows[0].get(kind) if rows else None
+        if not quote:
+            raise ValueError(f'no {kind} quoted at {strike} for {expiry}')
+        legs.append({
+            'expiryDate': expiry,
+            'strikePrice': strike,
+            'type': kind,
+            'quantity': quantity,
+            'price': quote['lastPrice'],
+            'impliedVolatility': quote['impliedVolatility'],
+        })
+    return legs
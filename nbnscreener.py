@@ -0,0 +1,307 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError, as_completed
+from datetime import datetime
+from itertools import combinations
+from math import comb
+import heapq
+import time
+import numpy
+from scipy.special import ndtr
+import nbnchain
+import nbngreeks
+
+
+class StrategyScreener:
+    '''Ranks multi-leg option strategies of one expiry, enumerating the strike combinations in batches
+
+    A strategy is a list of slots in increasing strike order, each slot holding the legs bought (+1)
+    or sold (-1) at that strike. Every batch fixes the lowest strike and takes the other slots from
+    a precomputed table of combinations, so a batch is a block of strike indices evaluated with
+    array operations: premium and net greeks are sums over legs, and the expiry payoff, being piecewise
+    linear between the strikes, gives max profit, max loss, breakevens and probability of profit
+    from its values at the strikes.
+    '''
+
+    strategies = {
+        'shortStraddle': ((('PE', -1), ('CE', -1)),),
+        'longStraddle': ((('PE', 1), ('CE', 1)),),
+        'shortStrangle': ((('PE', -1),), (('CE', -1),)),
+        'longStrangle': ((('PE', 1),), (('CE', 1),)),
+        'ironCondor': ((('PE', 1),), (('PE', -1),), (('CE', -1),), (('CE', 1),)),
+        'bullCallSpread': ((('CE', 1),), (('CE', -1),)),
+        'bearPutSpread': ((('PE', -1),), (('PE', 1),)),
+    }
+    '''legs of each strategy per slot, slots in increasing strike order'''
+
+    ranks = ('pop', 'maxProfit', 'rewardRisk')
+    '''what the top strategies can be ranked by'''
+
+    batch_size = 200000
+    '''combinations evaluated per batch'''
+
+    def __init__(self, state, expiry: str = None, roi: float = 0.07, now: datetime = None, strike_range: float = None):
+        """builds the per strike prices and greeks of one expiry
+
+        Args:
+            state (object): option chain payload as returned by index_option_chain
+            expiry (str, optional): expiry date as given by NSE. Defaults to the next expiry.
+            roi (float, optional): rate of interest. Defaults to 0.07.
+            now (datetime, optional): current market time. Defaults to current time.
+            strike_range (float, optional): keep only strikes within this share of the underlying value,
+                e.g. 0.1 for +-10%. Defaults to every strike.
+        """
+        now = now or datetime.now()
+        chain = nbnchain.OptionChain(state)
+        self.expiry = expiry or chain.next_expiry(now)
+        rows = chain.rows.get(self.expiry, [])
+        spot = chain.underlying_value
+        if strike_range is not None:
+            rows = [row for row in rows if abs(row['strikePrice'] - spot) <= strike_range * spot]
+        greeks = nbngreeks.NBNGreeks()
+        strike = numpy.asarray([row['strikePrice'] for row in rows], dtype=numpy.float64)
+        expiry_time = float(greeks.time_to_expiry([self.expiry], now)[0])
+        table = {'strike': strike, 'spot': spot, 'time': expiry_time, 'roi': roi}
+        at_the_money = []
+        for leg in ('CE', 'PE'):
+            quotes = [row.get(leg) or {} for row in rows]
+            price = numpy.asarray([quote.get('lastPrice') or numpy.nan for quote in quotes], dtype=numpy.float64)
+            iv = numpy.asarray([quote.get('impliedVolatility') or numpy.nan for quote in quotes], dtype=numpy.float64)
+            valuation = greeks.chain_valuation(spot, strike, expiry_time, roi, iv / 100, leg == 'CE')
+            table[leg] = {'price': price, 'iv': iv}
+            table[leg].update({name: valuation[name] for name in ('delta', 'gamma', 'theta', 'vega')})
+            if len(strike):
+                at_the_money.append(iv[numpy.argmin(numpy.abs(strike - spot))])
+        # the probability of profit uses a lognormal underlying at the at the money volatility
+        table['sigma'] = float(numpy.nanmean(at_the_money)) / 100 if at_the_money and not numpy.isnan(at_the_money).all() else numpy.nan
+        table['below'] = below(table, strike)
+        self.table = table
+
+    def batches(self, strategy: str, max_width: float = None):
+        """returns the lowest strike indices of each batch of a strategy
+
+        Args:
+            strategy (str): name from strategies
+            max_width (float, optional): largest strike distance between neighbouring slots. Defaults to no limit.
+
+        Returns:
+            list: arrays of lowest strike indices, one per batch
+        """
+        slots = self.strategies[strategy]
+        strike = self.table['strike']
+        quoted = numpy.ones(len(strike), dtype=bool)
+        for leg, _ in slots[0]:
+            quoted &= ~numpy.isnan(self.table[leg]['price'])
+        first = numpy.flatnonzero(quoted)
+        if len(slots) == 1:
+            return [first] if len(first) else []
+        result, current, size = [], [], 0
+        for i in first:
+            count = comb(candidates(strike, i, len(slots) - 1, max_width), len(slots) - 1)
+            if current and size + count > self.batch_size:
+                result.append(numpy.asarray(current))
+                current, size = [], 0
+            current.append(i)
+            size += count
+        if current:
+            result.append(numpy.asarray(current))
+        return result
+
+    def screen(self, strategy: str, top: int = 10, rank: str = 'pop', max_width: float = None, min_credit: float = None,
+               max_delta: float = None, short_delta: float = None, budget: float = None, processes: int = None):
+        """returns the top combinations of a strategy
+
+        Args:
+            strategy (str): name from strategies
+            top (int, optional): combinations returned. Defaults to 10.
+            rank (str, optional): pop, maxProfit or rewardRisk. Defaults to 'pop'.
+            max_width (float, optional): largest strike distance between neighbouring slots. Defaults to no limit.
+            min_credit (float, optional): smallest net premium received, debit strategies have a negative
+                premium so e.g. -100 caps their cost at 100. Defaults to None.
+            max_delta (float, optional): largest absolute net delta. Defaults to None.
+            short_delta (float, optional): largest absolute delta of a sold leg. Defaults to None.
+            budget (float, optional): seconds to spend, batches not started by then are skipped. Defaults to no limit.
+            processes (int, optional): worker processes, None to screen in this process. Defaults to None.
+
+        Returns:
+            dict: strategy, expiry, combinations evaluated, whether every batch ran, seconds taken and the top results
+        """
+        if strategy not in self.strategies:
+            raise ValueError(f'unknown strategy {strategy}, use one of {", ".join(self.strategies)}')
+        if rank not in self.ranks:
+            raise ValueError(f'unknown rank {rank}, use one of {", ".join(self.ranks)}')
+        started = time.monotonic()
+        deadline = None if budget is None else started + budget
+        constraints = {'max_width': max_width, 'min_credit': min_credit, 'max_delta': max_delta, 'short_delta': short_delta}
+        batches = self.batches(strategy, max_width)
+        found, evaluated, done = [], 0, 0
+        if processes:
+            executor = ProcessPoolExecutor(max_workers=processes)
+            jobs = [executor.submit(screen_batch, self.table, strategy, first, constraints, rank, top) for first in batches]
+            try:
+                for job in as_completed(jobs, timeout=None if deadline is None else max(deadline - time.monotonic(), 0)):
+                    results, count = job.result()
+                    found.extend(results)
+                    evaluated += count
+                    done += 1
+            except TimeoutError:
+                pass
+            finally:
+                # batches still queued when the budget runs out are dropped rather than waited for
+                executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            for first in batches:
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                results, count = screen_batch(self.table, strategy, first, constraints, rank, top)
+                found.extend(results)
+                evaluated += count
+                done += 1
+        return {
+            'strategy': strategy,
+            'expiry': self.expiry,
+            'underlyingValue': self.table['spot'],
+            'evaluated': evaluated,
+            'complete': done == len(batches),
+            'seconds': round(time.monotonic() - started, 4),
+            'results': [result for _, _, result in heapq.nlargest(top, found, key=lambda entry: entry[:2])],
+        }
+
+
+def candidates(strike, first: int, slots: int, max_width: float = None):
+    """returns how many strikes above the first can take the remaining slots"""
+    if max_width is None:
+        return len(strike) - first - 1
+    return int(numpy.searchsorted(strike, strike[first] + slots * max_width, side='right')) - first - 1
+
+
+combination_tables = {}
+'''combination tables already built, by count and size'''
+
+
+def combination_table(count: int, size: int):
+    """returns the size-combinations of range(count) in colex order, so the ones drawn from range(m) are a prefix"""
+    table = combination_tables.get((count, size))
+    if table is None:
+        table = numpy.asarray(list(combinations(range(count), size)), dtype=numpy.int64).reshape(-1, size)
+        # lexsort takes the last key as the primary one, i.e. the largest index of each combination
+        table = table[numpy.lexsort(table.T)]
+        combination_tables[(count, size)] = table
+    return table
+
+
+def indices(strike, first, slots: int, max_width: float = None):
+    """returns the strike indices of every combination starting at the given lowest strikes"""
+    if slots == 1:
+        return numpy.asarray(first).reshape(-1, 1)
+    blocks = []
+    widest = max(candidates(strike, i, slots - 1, max_width) for i in first)
+    table = combination_table(widest, slots - 1)
+    for i in first:
+        count = comb(candidates(strike, i, slots - 1, max_width), slots - 1)
+        rest = i + 1 + table[:count]
+        blocks.append(numpy.column_stack((numpy.full(count, i), rest)))
+    return numpy.concatenate(blocks) if blocks else numpy.empty((0, slots), dtype=numpy.int64)
+
+
+def below(table, level):
+    """returns the risk neutral probability that the underlying ends below level"""
+    spot, sigma, expiry_time, roi = table['spot'], table['sigma'], table['time'], table['roi']
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        d2 = (numpy.log(spot / level) + (roi - sigma * sigma / 2) * expiry_time) / (sigma * numpy.sqrt(expiry_time))
+    return numpy.where(level <= 0, 0.0, numpy.where(numpy.isinf(level), 1.0, ndtr(-d2)))
+
+
+def screen_batch(table, strategy: str, first, constraints: dict, rank: str, top: int):
+    """evaluates one batch of a strategy and returns its top combinations and the number evaluated
+
+    Kept at module level so that it can run in the worker processes of StrategyScreener.screen.
+    """
+    slots = StrategyScreener.strategies[strategy]
+    strike = table['strike']
+    index = indices(strike, first, len(slots), constraints['max_width'])
+    evaluated = len(index)
+    levels = strike[index]
+    premium = numpy.zeros(evaluated)
+    greeks = {name: numpy.zeros(evaluated) for name in ('delta', 'gamma', 'theta', 'vega')}
+    valid = numpy.ones(evaluated, dtype=bool)
+    for position, slot in enumerate(slots):
+        for leg, quantity in slot:
+            columns = table[leg]
+            price = columns['price'][index[:, position]]
+            valid &= ~numpy.isnan(price)
+            premium -= quantity * price
+            for name in greeks:
+                greeks[name] += quantity * columns[name][index[:, position]]
+            if quantity < 0 and constraints['short_delta'] is not None:
+                valid &= numpy.abs(columns['delta'][index[:, position]]) <= constraints['short_delta']
+    if constraints['max_width'] is not None and len(slots) > 1:
+        valid &= (numpy.diff(levels, axis=1) <= constraints['max_width']).all(axis=1)
+    if constraints['min_credit'] is not None:
+        valid &= premium >= constraints['min_credit']
+    if constraints['max_delta'] is not None:
+        valid &= numpy.abs(greeks['delta']) <= constraints['max_delta']
+    # only the combinations left by the constraints go through the payoff
+    index, levels, premium = index[valid], levels[valid], premium[valid]
+    greeks = {name: values[valid] for name, values in greeks.items()}
+    if len(index) == 0:
+        return [], evaluated
+
+    # the payoff at expiry is checked at 0 and at every slot strike, and beyond the last one by its slope
+    points = numpy.column_stack((numpy.zeros(len(index)), levels))
+    payoff = numpy.repeat(premium[:, None], len(slots) + 1, axis=1)
+    slope = numpy.zeros(len(index))
+    for position, slot in enumerate(slots):
+        for leg, quantity in slot:
+            if leg == 'CE':
+                payoff += quantity * numpy.maximum(points - levels[:, position:position + 1], 0)
+                slope += quantity
+            else:
+                payoff += quantity * numpy.maximum(levels[:, position:position + 1] - points, 0)
+    max_profit = numpy.where(slope > 0, numpy.inf, payoff.max(axis=1))
+    max_loss = numpy.where(slope < 0, numpy.inf, -payoff.min(axis=1))
+
+    # breakevens and probability of profit segment by segment, the probabilities at the strikes are looked up
+    below_points = numpy.column_stack((numpy.zeros(len(index)), table['below'][index]))
+    breakevens = numpy.full((len(index), len(slots) + 1), numpy.nan)
+    pop = numpy.zeros(len(index))
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        for segment in range(len(slots)):
+            low, high = points[:, segment], points[:, segment + 1]
+            start, end = payoff[:, segment], payoff[:, segment + 1]
+            crossing = (start > 0) != (end > 0)
+            breakevens[:, segment] = numpy.where(crossing, low + (high - low) * start / (start - end), numpy.nan)
+            at_root = below(table, breakevens[:, segment])
+            pop += numpy.where(start > 0, numpy.where(end > 0, below_points[:, segment + 1], at_root) - below_points[:, segment],
+                               numpy.where(end > 0, below_points[:, segment + 1] - at_root, 0.0))
+        last, end = points[:, -1], payoff[:, -1]
+        root = numpy.where(slope != 0, last - end / slope, numpy.nan)
+        breakevens[:, -1] = numpy.where(root > last, root, numpy.nan)
+        at_root = below(table, root)
+        pop += numpy.where(end > 0, numpy.where(slope >= 0, 1 - below_points[:, -1], at_root - below_points[:, -1]),
+                           numpy.where(slope > 0, 1 - at_root, 0.0))
+        score = {
+            'pop': pop,
+            'maxProfit': max_profit,
+            'rewardRisk': numpy.where(max_loss > 0, max_profit / max_loss, numpy.inf),
+        }[rank]
+    score = numpy.where((max_profit > 0) & ~numpy.isnan(score), score, -numpy.inf)
+    count = min(top, int((score > -numpy.inf).sum()))
+    if count == 0:
+        return [], evaluated
+    best = numpy.argpartition(-score, count - 1)[:count]
+    results = []
+    for i in best:
+        legs = [{'type': leg, 'strikePrice': float(levels[i, position]), 'quantity': quantity,
+                 'price': float(table[leg]['price'][index[i, position]])}
+                for position, slot in enumerate(slots) for leg, quantity in slot]
+        result = {
+            'legs': legs,
+            'premium': round(float(premium[i]), 2),
+            'maxProfit': None if numpy.isinf(max_profit[i]) else round(float(max_profit[i]), 2),
+            'maxLoss': None if numpy.isinf(max_loss[i]) else round(max(float(max_loss[i]), 0), 2),
+            'breakevens': [round(float(level), 2) for level in breakevens[i] if not numpy.isnan(level)],
+            'pop': round(float(pop[i]), 4),
+            'greeks': {name: round(float(values[i]), 4) for name, values in greeks.items()},
+        }
+        # the lower strikes win ties so that results do not depend on how batches were split
+        results.append((float(score[i]), -float(levels[i].sum()), result))
+    return results, evaluated
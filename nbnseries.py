@@ -0,0 +1,208 @@
+from datetime import date, datetime, time, timedelta
+import json
+import os
+import pathlib
+import numpy
+
+
+class ChainSeries:
+    '''Memory mapped time series of one expiry on one trading day
+
+    Every field/leg pair is a file of float64 laid out strike by strike, so the series of one strike
+    is a contiguous slice and a strike appearing mid-day only appends a block to the file.
+    '''
+
+    fields = ('openInterest', 'lastPrice', 'impliedVolatility', 'totalTradedVolume')
+    legs = ('CE', 'PE')
+
+    def __init__(self, folder: str, day: date, resolution: int = 60, start: time = time(9, 15), end: time = time(15, 30)):
+        """opens (or creates) the series of one expiry for a day
+
+        Args:
+            folder (str): folder of the day/expiry
+            day (date): trading day
+            resolution (int, optional): seconds per slot. Defaults to 60.
+            start (time, optional): first slot of the session. Defaults to 09:15.
+            end (time, optional): end of the session. Defaults to 15:30.
+        """
+        self.folder = folder
+        self.day = day
+        self.resolution = resolution
+        self.start = datetime.combine(day, start)
+        self.slots = int((datetime.combine(day, end) - self.start).total_seconds() // resolution) + 1
+        pathlib.Path(folder).mkdir(parents=True, exist_ok=True)
+        self.strikes = []
+        strikes_path = os.path.join(folder, 'strikes.json')
+        if os.path.exists(strikes_path):
+            with open(strikes_path, 'r', encoding='utf8') as file:
+                self.strikes = json.load(file)
+        self.columns = {strike: i for i, strike in enumerate(self.strikes)}
+        self.underlying = self.__map('underlying', (self.slots,))
+        self.arrays = {}
+        for field in self.fields:
+            for leg in self.legs:
+                self.arrays[(field, leg)] = self.__map(f'{field}_{leg}', (len(self.strikes), self.slots))
+
+    def __map(self, name: str, shape: tuple):
+        """returns the memory map of a data file, growing it with nan up to shape"""
+        path = os.path.join(self.folder, name + '.f8')
+        size = int(numpy.prod(shape)) * 8
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        if old_size < size:
+            with open(path, 'ab') as file:
+                file.write(numpy.full((size - old_size) // 8, numpy.nan).tobytes())
+        if size == 0:
+            return numpy.empty(shape)
+        return numpy.memmap(path, dtype=numpy.float64, mode='r+', shape=shape)
+
+    def slot(self, when: datetime):
+        """returns the slot of a time, None outside the session"""
+        slot = int((when - self.start).total_seconds() // self.resolution)
+        return slot if 0 <= slot < self.slots else None
+
+    def clamp(self, when: datetime):
+        """returns the slot of a time, limited to the session"""
+        slot = int((when - self.start).total_seconds() // self.resolution)
+        return min(max(slot, 0), self.slots - 1)
+
+    def add_strikes(self, strikes):
+        """appends columns for strikes not seen yet, without touching the existing data"""
+        new = [strike for strike in strikes if strike not in self.columns]
+        if not new:
+            return
+        for strike in new:
+            self.columns[strike] = len(self.strikes)
+            self.strikes.append(strike)
+        self.flush()
+        for key in self.arrays:
+            self.arrays[key] = self.__map(f'{key[0]}_{key[1]}', (len(self.strikes), self.slots))
+        with open(os.path.join(self.folder, 'strikes.json'), 'w', encoding='utf8') as file:
+            json.dump(self.strikes, file)
+
+    def ingest(self, when: datetime, rows: list, underlying_value: float = None):
+        """writes the rows of a snapshot into the slot of its time
+
+        Args:
+            when (datetime): snapshot time
+            rows (list): option chain rows of this expiry
+            underlying_value (float, optional): underlying value at that time. Defaults to None.
+
+        Returns:
+            bool: False when the time is outside the session
+        """
+        slot = self.slot(when)
+        if slot is None:
+            return False
+        self.add_strikes([row['strikePrice'] for row in rows])
+        columns = numpy.fromiter((self.columns[row['strikePrice']] for row in rows), dtype=numpy.intp, count=len(rows))
+        for (field, leg), array in self.arrays.items():
+            values = numpy.fromiter(((row.get(leg) or {}).get(field, numpy.nan) for row in rows), dtype=numpy.float64, count=len(rows))
+            array[columns, slot] = values
+        if underlying_value is not None:
+            self.underlying[slot] = underlying_value
+        return True
+
+    def series(self, field: str, leg: str, strike: float, start: datetime = None, end: datetime = None):
+        """returns a zero copy view of a field of one strike over time, e.g. OI of 18000 CE from 09:15 to 15:30
+
+        Args:
+            field (str): one of fields
+            leg (str): CE or PE
+            strike (float): strike price
+            start (datetime, optional): first time included. Defaults to the session start.
+            end (datetime, optional): last time included. Defaults to the session end.
+
+        Returns:
+            numpy.ndarray: values per slot, nan where there was no snapshot
+        """
+        first = 0 if start is None else self.clamp(start)
+        last = self.slots if end is None else self.clamp(end) + 1
+        return self.arrays[(field, leg)][self.columns[strike], first:last]
+
+    def smile(self, field: str, leg: str, when: datetime):
+        """returns the strikes and a zero copy view of a field across strikes at one time, e.g. the IV smile at 11:00
+
+        Args:
+            field (str): one of fields
+            leg (str): CE or PE
+            when (datetime): time of the slot
+
+        Returns:
+            tuple: strikes in column order and the values of the slot
+        """
+        return self.strikes, self.arrays[(field, leg)][:, self.slot(when)]
+
+    def times(self):
+        """returns the start time of every slot"""
+        return [self.start + timedelta(seconds=self.resolution * slot) for slot in range(self.slots)]
+
+    def flush(self):
+        """writes the pending changes of the memory maps to disk"""
+        for array in list(self.arrays.values()) + [self.underlying]:
+            if isinstance(array, numpy.memmap):
+                array.flush()
+
+
+class NBNSeries:
+    '''Historical option chain store, one ChainSeries per trading day, underlying and expiry
+
+    The series of the default underlying live in <path>/<day>/<expiry>, as before symbols were
+    supported, and those of the other underlyings in <path>/<day>/<symbol>/<expiry>.
+    '''
+
+    date_format = '%d-%b-%Y'
+
+    def __init__(self, path: str, resolution: int = 60):
+        """creates the store
+
+        Args:
+            path (str): root folder
+            resolution (int, optional): seconds per slot. Defaults to 60.
+        """
+        self.path = path
+        self.resolution = resolution
+        self.__open = {}
+
+    def open(self, day: date, expiry: str, symbol: str = None):
+        """returns the series of an expiry on a day
+
+        Args:
+            day (date): trading day
+            expiry (str): expiry date as given by NSE
+            symbol (str, optional): underlying, None for the default one. Defaults to None.
+
+        Returns:
+            ChainSeries: the series
+        """
+        key = (day, symbol, expiry)
+        if key not in self.__open:
+            folders = (day.strftime('%Y%m%d'),) + ((symbol,) if symbol is not None else ()) + (expiry,)
+            self.__open[key] = ChainSeries(os.path.join(self.path, *folders), day, self.resolution)
+        return self.__open[key]
+
+    def ingest(self, state, when: datetime = None, symbol: str = None):
+        """writes an option chain payload into the series of each of its expiries
+
+        Args:
+            state (object): payload returned by index_option_chain
+            when (datetime, optional): snapshot time. Defaults to the payload timestamp.
+            symbol (str, optional): underlying of the payload, None for the default one. Defaults to None.
+
+        Returns:
+            int: number of expiries written
+        """
+        records = state['records']
+        if when is None:
+            when = datetime.strptime(records['timestamp'], self.date_format + ' %H:%M:%S')
+        by_expiry = {}
+        for row in records['data']:
+            by_expiry.setdefault(row['expiryDate'], []).append(row)
+        written = 0
+        for expiry, rows in by_expiry.items():
+            written += self.open(when.date(), expiry, symbol).ingest(when, rows, records.get('underlyingValue'))
+        return written
+
+    def flush(self):
+        """writes the pending changes of every open series to disk"""
+        for series in self.__open.values():
+            series.flush()
@@ -0,0 +1,229 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+from urllib.parse import parse_qsl, urlsplit
+import nbngreeks
+import nbnmain
+
+logger = logging.getLogger(__name__)
+
+
+class BadRequest(Exception):
+    '''Missing or invalid query parameter, answered with 400 Bad Request'''
+
+
+class NBNServer:
+    '''Long running HTTP/JSON service keeping one NiftyBankNifty instance resident'''
+
+    reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+    def __init__(self, nbn: nbnmain.NiftyBankNifty = None, host: str = '127.0.0.1', port: int = 8080, workers: int = 8):
+        """creates the service
+
+        Args:
+            nbn (nbnmain.NiftyBankNifty, optional): instance to serve. Defaults to a new one.
+            host (str, optional): address to listen on. Defaults to '127.0.0.1'.
+            port (int, optional): port to listen on. Defaults to 8080.
+            workers (int, optional): threads running the blocking fetch and compute calls. Defaults to 8.
+        """
+        self.nbn = nbn or nbnmain.NiftyBankNifty()
+        self.nbn.output_format = 'none'
+        self.greeks = nbngreeks.NBNGreeks()
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.server = None
+        self.routes = {
+            '/status': lambda query: self.nbn.current_status(),
+            '/market': lambda query: self.nbn.main_market_data(),
+            '/optionChain': lambda query: self.nbn.opt_chain(self.limit(query), query.get('expiry'), self.symbol(query)),
+            '/expiry': lambda query: self.nbn.get_all_expiry(self.symbol(query)),
+            '/allIndices': lambda query: self.nbn.all_indices(query.get('index')),
+            '/derivativeTurnover': lambda query: self.nbn.derivate_turnover(),
+            '/liveIndex': lambda query: self.nbn.live_index(self.symbol(query)),
+            '/liveFnO': lambda query: self.nbn.live_fno(),
+            '/marketTurnover': lambda query: self.nbn.market_turnover(),
+            '/snapshot': lambda query: self.nbn.snapshot(self.number(query, 'timeout', float, 10)),
+            '/pivot': lambda query: self.nbn.get_pivot(self.symbol(query)),
+            '/greeks': self.chain_greeks,
+            '/chainGreeks': lambda query: self.nbn.chain_greeks(self.symbol(query)),
+            '/topFnO': self.top_fno,
+            '/analytics': lambda query: self.nbn.chain_analytics(self.symbol(query), query.get('expiry'),
+                                                                self.number(query, 'top', int, 5)),
+            '/scenario': self.scenario,
+            '/screen': self.screen,
+            '/multiSymbol': lambda query: self.nbn.multi_symbol(self.symbols(query), self.number(query, 'limit', int, 10)),
+            '/cacheStats': lambda query: self.nbn.cache_stats(),
+            '/greeksStats': lambda query: self.nbn.greeks_stats(),
+            '/profile': lambda query: self.nbn.profiler.report(),
+        }
+
+    @staticmethod
+    def number(query: dict, name: str, kind=float, default=None):
+        """returns a numeric query parameter, default when missing (required when default is None)"""
+        if name not in query:
+            if default is None:
+                raise BadRequest(f'missing parameter {name}')
+            return default
+        try:
+            return kind(query[name])
+        except ValueError:
+            raise BadRequest(f'{name} must be {"an integer" if kind is int else "a number"}, got {query[name]!r}') from None
+
+    @staticmethod
+    def choice(name: str, value: str, choices):
+        """returns a value checked against the allowed ones"""
+        if value not in choices:
+            raise BadRequest(f'unknown {name} {value}, use one of {", ".join(choices)}')
+        return value
+
+    def limit(self, query: dict):
+        """returns the limit parameter of the option chain, -1 (whole chain) or 1 to 100 strikes"""
+        limit = self.number(query, 'limit', int, -1)
+        if limit != -1 and not 1 <= limit <= 100:
+            raise BadRequest(f'limit must be -1 or from 1 to 100, got {limit}')
+        return limit
+
+    def symbol(self, query: dict):
+        """returns the symbol parameter, None when missing"""
+        return self.choice('symbol', query['symbol'].upper(), self.nbn.symbols) if 'symbol' in query else None
+
+    def symbols(self, query: dict):
+        """returns the comma separated symbols parameter, None when missing"""
+        if 'symbols' not in query:
+            return None
+        return [self.choice('symbol', symbol, self.nbn.symbols) for symbol in query['symbols'].upper().split(',')]
+
+    def top_fno(self, query: dict):
+        """ranks the calls and puts by the comma separated metrics"""
+        import nbnanalytics
+        metrics = None
+        if 'metrics' in query:
+            metrics = [self.choice('metric', metric, nbnanalytics.TopOptions.metrics) for metric in query['metrics'].split(',')]
+        return self.nbn.top_fno(self.symbol(query), metrics, self.number(query, 'top', int, 5))
+
+    def chain_greeks(self, query: dict):
+        """returns the greeks of comma separated spot, strike, time, roi and sigma lists"""
+        arrays = []
+        for name in ('spot', 'strike', 'time', 'roi', 'sigma'):
+            if name not in query:
+                raise BadRequest(f'missing parameter {name}')
+            try:
+                arrays.append([float(x) for x in query[name].split(',')])
+            except ValueError:
+                raise BadRequest(f'{name} must be comma separated numbers, got {query[name]!r}') from None
+        lengths = {len(values) for values in arrays} - {1}
+        if len(lengths) > 1:
+            raise BadRequest('spot, strike, time, roi and sigma must have one value or the same number of values')
+        greeks = self.greeks.chain_greeks(*arrays)
+        return {name: values.tolist() for name, values in greeks.items()}
+
+    def scenario(self, query: dict):
+        """values the legs given as expiry:strike:CE|PE:quantity, comma separated, over the scenario grid"""
+        if 'legs' not in query:
+            raise BadRequest('missing parameter legs')
+        picks = []
+        for leg in query['legs'].split(','):
+            parts = leg.split(':')
+            try:
+                expiry, strike, kind, quantity = parts
+                picks.append((expiry, float(strike), self.choice('leg type', kind.upper(), ('CE', 'PE')), float(quantity)))
+            except ValueError:
+                raise BadRequest(f'legs must be expiry:strike:CE|PE:quantity, got {leg!r}') from None
+        days = self.number(query, 'days', int) if 'days' in query else None
+        symbol = self.symbol(query)
+        chain = self.nbn.get_chain(self.nbn.fetch_symbol('index_option_chain', symbol), symbol)
+        for expiry, strike, kind, _ in picks:
+            rows = chain.expiry_rows(expiry, [strike])
+            if not rows or not rows[0].get(kind):
+                raise BadRequest(f'no {kind} quoted at {strike} for {expiry}')
+        return self.nbn.scenario(picks, symbol, self.number(query, 'spot', float, 3), self.number(query, 'vol', float, 2), days)
+
+    def screen(self, query: dict):
+        """ranks a strategy, with the same options as the -screen command line"""
+        import nbnscreener
+        numbers = {'top': int, 'budget': float, 'width': float, 'credit': float, 'delta': float, 'shortDelta': float}
+        names = {'width': 'max_width', 'credit': 'min_credit', 'delta': 'max_delta', 'shortDelta': 'short_delta'}
+        options = {names.get(name, name): self.number(query, name, kind) for name, kind in numbers.items() if name in query}
+        strategy = self.choice('strategy', query.get('strategy', 'ironCondor'), nbnscreener.StrategyScreener.strategies)
+        rank = self.choice('rank', query.get('rank', 'pop'), nbnscreener.StrategyScreener.ranks)
+        return self.nbn.screen_strategies(strategy, self.symbol(query), query.get('expiry'), rank=rank, **options)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """serves the requests of one keep-alive connection"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3:
+                    await self.respond(writer, 400, {'error': 'malformed request line'}, False)
+                    break
+                method, target, version = parts
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                url = urlsplit(target)
+                route = self.routes.get(url.path)
+                if method != 'GET':
+                    status, body = 405, {'error': 'only GET is supported'}
+                elif route is None:
+                    status, body = 404, {'error': f'unknown path {url.path}', 'paths': sorted(self.routes)}
+                else:
+                    try:
+                        status, body = 200, await loop.run_in_executor(self.executor, route, dict(parse_qsl(url.query)))
+                    except BadRequest as error:
+                        status, body = 400, {'error': str(error)}
+                    except Exception as error:
+                        logger.exception('%s failed', target)
+                        status, body = 500, {'error': repr(error)}
+                await self.respond(writer, status, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer: asyncio.StreamWriter, status: int, body, keep_alive: bool):
+        """writes a json response"""
+        if hasattr(body, 'to_payload'):
+            # tables returned when the instance uses the table row_format
+            body = body.to_payload()
+        payload = json.dumps(body, separators=(',', ':')).encode('utf8')
+        head = (f'HTTP/1.1 {status} {self.reasons.get(status, "")}\r\n'
+                'Content-Type: application/json\r\n'
+                f'Content-Length: {len(payload)}\r\n'
+                f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
+
+    async def start(self):
+        """starts listening, returns once the socket is bound"""
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.server
+
+    async def serve(self):
+        """listens until cancelled"""
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def run(self):
+        """runs the service in the current thread until interrupted"""
+        print(f'serving on http://{self.host}:{self.port}')
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,144 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+import json
+import os
+import pathlib
+import threading
+
+
+class SegmentStore:
+    '''Append only store of compact json snapshots, one segmented log per method'''
+
+    index_name = 'index.tsv'
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, max_seconds: int = 24 * 60 * 60):
+        """creates the store
+
+        Args:
+            path (str): root folder, every method gets its own sub folder
+            max_bytes (int, optional): size after which a new segment is started. Defaults to 64MB.
+            max_seconds (int, optional): age after which a new segment is started. Defaults to a day.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.__segments = {}
+        self.__indexes = {}
+        self.__keys = {}
+        self.__lock = threading.Lock()
+
+    def folder(self, method: str):
+        """returns the folder of a method"""
+        return os.path.join(self.path, method)
+
+    def __segment(self, method: str, now: datetime):
+        """returns name, start and size of the segment to append to, rotating it when full or old"""
+        segment = self.__segments.get(method)
+        if segment is None:
+            index = self.index(method)
+            if index:
+                name = index[-1][1]
+                size = os.path.getsize(os.path.join(self.folder(method), name))
+                segment = [name, datetime.strptime(name[:-len('.ndjson')], '%Y%m%dT%H%M%S%f'), size]
+        if segment is None or segment[2] >= self.max_bytes or (now - segment[1]).total_seconds() >= self.max_seconds:
+            segment = [now.strftime('%Y%m%dT%H%M%S%f') + '.ndjson', now, 0]
+        self.__segments[method] = segment
+        return segment
+
+    def append(self, method: str, message, now: datetime = None):
+        """appends a snapshot to the log of a method and indexes its offset
+
+        Args:
+            method (str): name of the method that produced the snapshot
+            message (object): json serializable snapshot
+            now (datetime, optional): timestamp of the snapshot. Defaults to datetime.now().
+
+        Returns:
+            str: timestamp the snapshot is indexed under
+        """
+        return self.append_encoded(method, json.dumps(message, separators=(',', ':')), now)
+
+    def append_encoded(self, method: str, encoded: str, now: datetime = None):
+        """appends a snapshot already encoded as single line json, e.g. a raw NSE response, see append"""
+        line = (encoded + '\n').encode('utf8')
+        with self.__lock:
+            now = now or datetime.now()
+            folder = self.folder(method)
+            pathlib.Path(folder).mkdir(parents=True, exist_ok=True)
+            segment = self.__segment(method, now)
+            index = self.index(method)
+            if index and now <= datetime.fromisoformat(index[-1][0]):
+                # keep timestamps unique and sorted even if the clock goes back or two writes share a microsecond
+                now = datetime.fromisoformat(index[-1][0]) + timedelta(microseconds=1)
+            timestamp = now.isoformat(timespec='microseconds')
+            with open(os.path.join(folder, segment[0]), 'ab') as file:
+                file.write(line)
+            entry = (timestamp, segment[0], segment[2], len(line))
+            with open(os.path.join(folder, self.index_name), 'a', encoding='utf8') as file:
+                file.write('\t'.join(str(x) for x in entry) + '\n')
+            index.append(entry)
+            self.__keys[method].append(timestamp)
+            segment[2] += len(line)
+        return timestamp
+
+    def methods(self):
+        """returns the names of the methods that have snapshots in the store, sorted"""
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if os.path.exists(os.path.join(self.folder(name), self.index_name)))
+
+    def index(self, method: str):
+        """returns the (timestamp, segment, offset, length) entries of a method, oldest first"""
+        index = self.__indexes.get(method)
+        if index is None:
+            index = []
+            try:
+                with open(os.path.join(self.folder(method), self.index_name), 'r', encoding='utf8') as file:
+                    for line in file:
+                        timestamp, segment, offset, length = line.rstrip('\n').split('\t')
+                        index.append((timestamp, segment, int(offset), int(length)))
+            except FileNotFoundError:
+                pass
+            self.__indexes[method] = index
+            self.__keys[method] = [entry[0] for entry in index]
+        return index
+
+    def read(self, method: str, entry):
+        """returns the snapshot of an index entry without scanning its segment"""
+        with open(os.path.join(self.folder(method), entry[1]), 'rb') as file:
+            file.seek(entry[2])
+            return json.loads(file.read(entry[3]))
+
+    def get(self, method: str, when):
+        """returns the latest snapshot taken at or before a time
+
+        Args:
+            method (str): name of the method that produced the snapshot
+            when (datetime | str): time, or an iso timestamp
+
+        Returns:
+            object: the snapshot, None if there is none
+        """
+        index = self.index(method)
+        when = when.isoformat(timespec='microseconds') if isinstance(when, datetime) else when
+        position = bisect_right(self.__keys[method], when) - 1
+        return self.read(method, index[position]) if position >= 0 else None
+
+    def range(self, method: str, start=None, end=None):
+        """yields (timestamp, snapshot) for every snapshot between two times, both included
+
+        Args:
+            method (str): name of the method that produced the snapshots
+            start (datetime | str, optional): first time. Defaults to the oldest snapshot.
+            end (datetime | str, optional): last time. Defaults to the newest snapshot.
+        """
+        index = self.index(method)
+        start = start.isoformat(timespec='microseconds') if isinstance(start, datetime) else start
+        end = end.isoformat(timespec='microseconds') if isinstance(end, datetime) else end
+        keys = self.__keys[method]
+        first = bisect_left(keys, start) if start is not None else 0
+        last = bisect_right(keys, end) if end is not None else len(index)
+        for entry in index[first:last]:
+            yield entry[0], self.read(method, entry)
@@ -0,0 +1,318 @@
+from datetime import datetime
+import sys
+import numpy
+
+
+class ColumnTable:
+    '''Rows of dicts held column by column in one numpy structured array
+
+    Every key of the rows is a field of the array with the same name, and nested dicts such as the
+    CE and PE legs of an option chain row are nested fields, so table['CE']['lastPrice'] is the
+    column of call prices. Ints are int32 (int64 when larger) when every row holds one and other
+    numbers float64, with None as nan. Strings repeated across rows are int32 codes into labels shared by every view of
+    the table, the others fixed width bytes. Indexing with a slice returns a view on the same array,
+    so a part of a table costs no copy.
+
+    The 3600 rows of the worst case option chain of nbnbench take about 1.1 MB this way, against
+    about 8.8 MB as decoded dicts. Turning a table back into rows costs what building the dicts
+    costs, see to_payload.
+    '''
+
+    coded = ()
+    '''field paths stored as codes whatever the number of distinct strings'''
+
+    def __init__(self, array: numpy.ndarray, labels: dict, meta: dict = None, key: str = None):
+        """wraps a structured array
+
+        Args:
+            array (numpy.ndarray): structured array, e.g. from from_rows
+            labels (dict): per field path (tuple of names) of a coded or text field, the list of labels
+                of a coded field or None for a text field
+            meta (dict, optional): fields of the payload the rows were read from, other than the rows. Defaults to None.
+            key (str, optional): key of the rows in that payload, None when the rows were a plain list. Defaults to None.
+        """
+        self.array = array
+        self.labels = labels
+        self.meta = meta if meta is not None else {}
+        self.key = key
+
+    @classmethod
+    def from_rows(cls, rows: list, meta: dict = None, key: str = None):
+        """builds a table from a list of dicts
+
+        Args:
+            rows (list): dicts, nested dicts become nested fields
+            meta (dict, optional): fields of the payload other than the rows. Defaults to None.
+            key (str, optional): key of the rows in the payload. Defaults to None.
+
+        Returns:
+            ColumnTable: the table
+        """
+        rows = list(rows)
+        labels = {}
+        dtype, columns = layout(rows, (), labels, cls.coded)
+        array = numpy.empty(len(rows), dtype=dtype)
+        for path, column in columns:
+            target = array
+            for name in path[:-1]:
+                target = target[name]
+            target[path[-1]] = column
+        return cls(array, labels, meta, key)
+
+    @classmethod
+    def from_payload(cls, state: dict, key: str = 'data'):
+        """builds a table from the rows of a payload such as all_indices or live_fno, keeping its other fields as meta"""
+        return cls.from_rows(state[key], {name: value for name, value in state.items() if name != key}, key)
+
+    def view(self, array: numpy.ndarray):
+        """returns a table of the same kind over other rows of the array, sharing labels and meta"""
+        return type(self)(array, self.labels, self.meta, self.key)
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, item):
+        """returns the column of a field name, the dict of a row number, or a table of the selected rows
+
+        Slices return views, masks and index arrays return copies of the selected rows.
+        """
+        if isinstance(item, str):
+            return self.array[item]
+        if isinstance(item, (int, numpy.integer)):
+            return self.view(self.array[item:item + 1 or None]).to_rows()[0]
+        return self.view(self.array[item])
+
+    def __iter__(self):
+        return iter(self.to_rows())
+
+    @property
+    def nbytes(self):
+        """returns the bytes held by the array and the labels of its coded fields"""
+        size = self.array.nbytes
+        for values in self.labels.values():
+            if values is not None:
+                size += sum(sys.getsizeof(label) for label in values)
+        return size
+
+    def column(self, *path):
+        """returns the values of a field as a list, strings decoded and nan as None
+
+        Args:
+            path (str): field name, preceded by the names of the dicts it is nested in, e.g. ('CE', 'lastPrice')
+
+        Returns:
+            list: one value per row
+        """
+        values = self.array
+        for name in path:
+            values = values[name]
+        return self.__decode(path, values)
+
+    def __decode(self, path: tuple, values: numpy.ndarray):
+        """returns the values of one non nested field as python values"""
+        if path in self.labels:
+            labels = self.labels[path]
+            if labels is None:
+                return [value.decode('utf8') for value in values.tolist()]
+            return [labels[code] if code >= 0 else None for code in values.tolist()]
+        if values.dtype.kind == 'f':
+            return [None if value != value else value for value in values.tolist()]
+        return values.tolist()
+
+    def __records(self, array: numpy.ndarray, path: tuple):
+        """returns the rows of a structured array, nested dicts whose every value is None left out"""
+        names = array.dtype.names
+        columns = []
+        for name in names:
+            values = array[name]
+            if values.dtype.names is not None:
+                columns.append(self.__records(values, path + (name,)))
+            else:
+                columns.append(self.__decode(path + (name,), values))
+        rows = []
+        for values in zip(*columns):
+            rows.append({name: value for name, value in zip(names, values)
+                         if not (isinstance(value, dict) and not value)})
+        if path:
+            # a nested dict that was missing from a row reads back as all None
+            rows = [row if any(value is not None for value in row.values()) else {} for row in rows]
+        return rows
+
+    def to_rows(self):
+        """returns the rows as a list of dicts with the same fields as the rows the table was built from
+
+        Numbers compare equal to the original ones, a key missing from a row reads back as None and a
+        nested dict missing from a row is left out.
+        """
+        if len(self.array) == 0:
+            return []
+        return self.__records(self.array, ())
+
+    def to_payload(self):
+        """returns the rows, inside the fields of the payload they were read from when there is one
+
+        Every row is built as a dict again, so json encoding a table through to_payload takes about
+        1.7 times as long as encoding the payload it was built from. Keep the payload when it is
+        written out as is.
+        """
+        if self.key is None:
+            return self.to_rows()
+        return dict(self.meta, **{self.key: self.to_rows()})
+
+
+class ChainTable(ColumnTable):
+    '''Option chain rows as a ColumnTable sorted by expiry and strike
+
+    Every expiry is a contiguous run of rows and its strikes are sorted, so the rows of an expiry
+    or of a strike range within it are slices of the array, found by binary search.
+    '''
+
+    date_format = '%d-%b-%Y'
+
+    coded = (('expiryDate',),)
+
+    filtered = None
+    '''table of the filtered (nearest expiry) rows when built by from_payload'''
+
+    @classmethod
+    def from_rows(cls, rows: list, meta: dict = None, key: str = None):
+        """builds the table of option chain rows, sorted by expiry date and strike, rows of equal expiry and strike kept in order
+
+        The expiry labels are put in date order, so the expiry codes are sorted as well.
+        """
+        table = super().from_rows(rows, meta, key)
+        if len(table) == 0:
+            return table
+        expiries = table.labels[('expiryDate',)]
+        try:
+            order = numpy.argsort([datetime.strptime(expiry, cls.date_format) for expiry in expiries], kind='stable')
+        except ValueError:
+            order = numpy.arange(len(expiries))
+        rank = numpy.empty(len(expiries) + 1, dtype=numpy.int32)
+        rank[order] = numpy.arange(len(expiries))
+        # a missing expiry is code -1, which stays -1 and sorts first
+        rank[-1] = -1
+        codes = table.array['expiryDate']
+        codes[:] = rank[codes]
+        table.labels[('expiryDate',)] = [expiries[i] for i in order]
+        return table.view(table.array[numpy.lexsort((table.array['strikePrice'], codes))])
+
+    @classmethod
+    def from_payload(cls, state: dict, key: str = 'data'):
+        """builds the table of the records rows of an option chain payload, with the filtered rows in filtered
+
+        Args:
+            state (object): option chain payload as returned by index_option_chain
+            key (str, optional): key of the rows in records and filtered. Defaults to 'data'.
+
+        Returns:
+            ChainTable: the records table, to_payload returns the whole payload again
+        """
+        records = state['records']
+        filtered = state.get('filtered', {})
+        table = cls.from_rows(records[key], {name: value for name, value in records.items() if name != key}, key)
+        table.filtered = cls.from_rows(filtered.get(key, []), {name: value for name, value in filtered.items() if name != key}, key)
+        return table
+
+    def expiry(self, expiry: str):
+        """returns the rows of an expiry as a view
+
+        Args:
+            expiry (str): expiry date as given by NSE
+
+        Returns:
+            ChainTable: rows of the expiry, sorted by strike, empty when the expiry is not listed
+        """
+        labels = self.labels.get(('expiryDate',), [])
+        if expiry not in labels:
+            return self[0:0]
+        codes = self.array['expiryDate']
+        code = labels.index(expiry)
+        return self[int(numpy.searchsorted(codes, code, 'left')):int(numpy.searchsorted(codes, code, 'right'))]
+
+    def strikes(self, low: float, high: float = None, expiry: str = None):
+        """returns the rows from low to high strike, both included, as a view
+
+        Args:
+            low (float): lowest strike
+            high (float, optional): highest strike. Defaults to low.
+            expiry (str, optional): expiry date, needed when the table holds several expiries. Defaults to None.
+
+        Returns:
+            ChainTable: the rows of those strikes
+        """
+        part = self.expiry(expiry) if expiry is not None else self
+        codes = part.array['expiryDate']
+        if len(codes) and codes[0] != codes[-1]:
+            raise ValueError('the table holds several expiries, pass the expiry')
+        strike = part.array['strikePrice']
+        start = numpy.searchsorted(strike, low, 'left')
+        end = numpy.searchsorted(strike, low if high is None else high, 'right')
+        return part[int(start):int(end)]
+
+    def to_payload(self):
+        """returns the option chain payload, records and filtered, when built by from_payload, else the rows"""
+        if self.filtered is None:
+            return super().to_payload()
+        return {'records': super().to_payload(), 'filtered': self.filtered.to_payload()}
+
+
+def layout(rows: list, path: tuple, labels: dict, coded: tuple = ()):
+    """returns the structured dtype of a list of dicts and the column of every field
+
+    Args:
+        rows (list): dicts, or None for a missing nested dict
+        path (tuple): names of the dicts the rows are nested in
+        labels (dict): filled with the labels of the string fields, see ColumnTable
+        coded (tuple, optional): field paths of string fields always stored as codes. Defaults to ().
+
+    Returns:
+        tuple: numpy dtype and the (path, values) of every non nested field
+    """
+    names = {}
+    for row in rows:
+        if row:
+            for name in row:
+                names.setdefault(name, None)
+    dtype = []
+    columns = []
+    for name in names:
+        values = [row.get(name) if row else None for row in rows]
+        present = [value for value in values if value is not None]
+        field = path + (name,)
+        if present and all(isinstance(value, dict) for value in present) and any(present):
+            nested, nested_columns = layout(values, field, labels, coded)
+            dtype.append((name, nested))
+            columns += nested_columns
+        elif present and len(present) == len(values) and all(type(value) is bool for value in present):
+            dtype.append((name, numpy.bool_))
+            columns.append((field, values))
+        elif present and len(present) == len(values) and all(type(value) is int for value in present):
+            small = -2 ** 31 <= min(values) and max(values) < 2 ** 31
+            dtype.append((name, numpy.int32 if small else numpy.int64))
+            columns.append((field, values))
+        elif present and all(type(value) in (int, float) for value in present):
+            dtype.append((name, numpy.float64))
+            columns.append((field, [numpy.nan if value is None else value for value in values]))
+        elif present and all(isinstance(value, str) for value in present):
+            codes = {}
+            for value in present:
+                codes.setdefault(value, len(codes))
+            if len(codes) * 2 <= len(values) or field in coded or len(present) < len(values):
+                # repeated strings (expiry, underlying, ...) are stored once, and only codes can hold None
+                labels[field] = list(codes)
+                dtype.append((name, numpy.int32))
+                columns.append((field, [-1 if value is None else codes[value] for value in values]))
+            else:
+                labels[field] = None
+                encoded = [value.encode('utf8') for value in values]
+                dtype.append((name, f'S{max(len(value) for value in encoded) or 1}'))
+                columns.append((field, encoded))
+        else:
+            column = numpy.empty(len(values), dtype=object)
+            for i, value in enumerate(values):
+                # set one by one so that lists stay single values
+                column[i] = value
+            dtype.append((name, object))
+            columns.append((field, column))
+    return numpy.dtype(dtype), columns
@@ -0,0 +1,179 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import json
+import os
+import pathlib
+import random
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from requests import ConnectionError, Response
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+class Cassette:
+    '''Folder of recorded responses keyed by request path and query'''
+
+    def __init__(self, path: str):
+        """opens the folder
+
+        Args:
+            path (str): folder of the recorded responses
+        """
+        self.path = path
+
+    def key(self, url: str):
+        """returns the host independent key of a url, query parameters sorted"""
+        parts = urlsplit(url)
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        return parts.path + ('?' + query if query else '')
+
+    def file(self, key: str):
+        """returns the file of a key"""
+        return os.path.join(self.path, hashlib.sha1(key.encode('utf8')).hexdigest() + '.json')
+
+    def save(self, url: str, status: int, content_type: str, body: bytes):
+        """records a response"""
+        pathlib.Path(self.path).mkdir(parents=True, exist_ok=True)
+        key = self.key(url)
+        with open(self.file(key), 'w', encoding='utf8') as file:
+            json.dump({'key': key, 'status': status, 'contentType': content_type,
+                       'body': body.decode('utf8', errors='replace')}, file)
+
+    def load(self, url: str):
+        """returns the recorded response of a url, None when it was not recorded"""
+        try:
+            with open(self.file(self.key(url)), 'r', encoding='utf8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+
+class Faults:
+    '''Latency, jitter and error injection shared by the in-process and the http replay'''
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, drop_rate: float = 0.0,
+                 error_status: int = 503, seed: int = 0):
+        """sets up the injection
+
+        Args:
+            latency (float, optional): seconds added to every response. Defaults to 0.0.
+            jitter (float, optional): up to this many seconds added or removed at random. Defaults to 0.0.
+            error_rate (float, optional): share of responses replaced by error_status. Defaults to 0.0.
+            drop_rate (float, optional): share of requests failing with a connection error. Defaults to 0.0.
+            error_status (int, optional): status of the injected errors. Defaults to 503.
+            seed (int, optional): random seed, so runs are repeatable. Defaults to 0.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.error_status = error_status
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+
+    def draw(self):
+        """returns the delay of a request and whether it is dropped or answered with an error"""
+        with self.__lock:
+            delay = max(self.latency + self.__random.uniform(-self.jitter, self.jitter), 0) if self.jitter else self.latency
+            drop = self.__random.random() < self.drop_rate if self.drop_rate else False
+            error = self.__random.random() < self.error_rate if self.error_rate else False
+        return delay, drop, error
+
+
+class RecordingAdapter(HTTPAdapter):
+    '''Transport adapter that calls the real site and records every response into a cassette'''
+
+    def __init__(self, cassette: Cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        self.cassette.save(request.url, response.status_code, response.headers.get('Content-Type', ''), response.content)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    '''Transport adapter answering from a cassette in-process, with injected latency and errors'''
+
+    def __init__(self, cassette: Cassette, faults: Faults = None):
+        super().__init__()
+        self.cassette = cassette
+        self.faults = faults or Faults()
+
+    def send(self, request, **kwargs):
+        delay, drop, error = self.faults.draw()
+        if delay:
+            time.sleep(delay)
+        if drop:
+            raise ConnectionError(f'injected connection error for {request.url}', request=request)
+        recorded = self.cassette.load(request.url)
+        response = Response()
+        response.url = request.url
+        response.request = request
+        response.encoding = 'utf-8'
+        if error:
+            response.status_code = self.faults.error_status
+            response._content = b''
+        elif recorded is None:
+            response.status_code = 404
+            response._content = b''
+        else:
+            response.status_code = recorded['status']
+            response._content = recorded['body'].encode('utf8')
+            response.headers = CaseInsensitiveDict({'Content-Type': recorded['contentType']})
+        return response
+
+    def close(self):
+        pass
+
+
+class ReplayServer:
+    '''Local http server answering from a cassette, with injected latency and errors'''
+
+    def __init__(self, cassette: Cassette, faults: Faults = None, port: int = 0):
+        """starts the server on a background thread
+
+        Args:
+            cassette (Cassette): recorded responses
+            faults (Faults, optional): injection settings. Defaults to none.
+            port (int, optional): port to listen on, 0 for any free port. Defaults to 0.
+        """
+        self.cassette = cassette
+        self.faults = faults or Faults()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                delay, drop, error = server.faults.draw()
+                if delay:
+                    time.sleep(delay)
+                if drop:
+                    self.close_connection = True
+                    return
+                recorded = server.cassette.load(self.path)
+                status = server.faults.error_status if error else (404 if recorded is None else recorded['status'])
+                body = b'' if error or recorded is None else recorded['body'].encode('utf8')
+                self.send_response(status)
+                self.send_header('Content-Type', recorded['contentType'] if recorded and not error else 'text/plain')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        """stops the server"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
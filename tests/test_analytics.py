@@ -0,0 +1,12 @@
+import nbnanalytics
+
+
+def test_leaders_only_list_strikes_moving_their_way():
+    rows = [{'strikePrice': strike, 'expiryDate': '27-Apr-2023',
+             'CE': {'openInterest': 1000, 'changeinOpenInterest': change, 'change': 1.0}}
+            for strike, change in ((17400, 50), (17500, -20), (17600, -80), (17700, 0))]
+    analytics = nbnanalytics.ChainAnalytics({'records': {'data': rows, 'underlyingValue': 17500,
+                                                         'expiryDates': ['27-Apr-2023']}})
+    leaders = analytics.leaders(analytics.slices['27-Apr-2023'], 'CE', 3)
+    assert [row['strikePrice'] for row in leaders['added']] == [17400]
+    assert [row['strikePrice'] for row in leaders['unwound']] == [17600, 17500]
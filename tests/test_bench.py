@@ -0,0 +1,26 @@
+import os
+import nbnbench
+
+
+def test_saved_baseline_is_compared_against(tmp_path):
+    bench = nbnbench.NBNBench()
+    baseline = {'small.pivot.scalar': {'opsPerSec': 1000.0, 'peakKB': 1.0}}
+    path = bench.save(baseline, str(tmp_path / 'baseline.json'))
+    assert bench.load(path) == baseline
+    slower = {'small.pivot.scalar': {'opsPerSec': 700.0, 'peakKB': 1.0}}
+    assert bench.compare(slower, bench.load(path)) == {
+        'small.pivot.scalar': {'opsPerSec': {'baseline': 1000.0, 'current': 700.0, 'change': -0.3}}}
+    faster = {'small.pivot.scalar': {'opsPerSec': 1500.0, 'peakKB': 1.1}}
+    assert bench.compare(faster, baseline) == {}
+    larger = {'small.pivot.scalar': {'opsPerSec': 1000.0, 'peakKB': 1.5}}
+    assert bench.compare(larger, baseline) == {
+        'small.pivot.scalar': {'peakKB': {'baseline': 1.0, 'current': 1.5, 'change': 0.5}}}
+    bench.memory_threshold = 0.6
+    assert bench.compare(larger, baseline) == {}
+
+
+def test_checked_in_baseline_covers_the_generated_payloads():
+    bench = nbnbench.NBNBench()
+    baseline = bench.load(os.path.join(os.getcwd(), 'bench_baseline.json'))
+    for name in bench.payloads:
+        assert f'{name}.optChain.limit5' in baseline
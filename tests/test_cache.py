@@ -0,0 +1,89 @@
+import copy
+import threading
+import time
+import nbnbench
+import nbncache
+import nbncodec
+import nbnmain
+
+
+def test_concurrent_misses_fetch_once():
+    cache = nbncache.NBNCache()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.05)
+        return {'data': [1, 2, 3]}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch('all_indices', fetch)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert cache.stats['misses'] == 1
+    assert cache.stats['shared'] + cache.stats['hits'] == 7
+
+
+def test_failed_fetch_is_not_cached():
+    cache = nbncache.NBNCache()
+
+    def fail():
+        raise ConnectionError('down')
+
+    for _ in range(2):
+        try:
+            cache.get_or_fetch('all_indices', fail)
+        except ConnectionError:
+            pass
+        else:
+            raise AssertionError('the error was not raised')
+    assert cache.get_or_fetch('all_indices', lambda: {'data': []}) == {'data': []}
+
+
+def test_size_is_estimated_without_encoding(monkeypatch):
+    cache = nbncache.NBNCache()
+
+    def dumps(value):
+        raise AssertionError('encoding is only needed by the disk tier')
+
+    monkeypatch.setattr(cache.codec, 'dumps', dumps)
+    cache.get_or_fetch('all_indices', lambda: {'data': [{'index': 'NIFTY 50', 'last': 17500.0}] * 100})
+    assert 2000 < cache.size < 8000
+
+
+def test_raw_chain_size_counts_what_it_decodes():
+    bench = nbnbench.NBNBench()
+    text = nbncodec.NBNCodec('json').dumps(bench.synthetic_chain(20, 3, now=bench.payload_time))
+    cache = nbncache.NBNCache(max_bytes=len(text) * 3 // 2)
+    cache.get_or_fetch('all_indices', lambda: {'data': []})
+    chain = cache.get_or_fetch('index_option_chain', lambda: nbncodec.RawChain(text))
+    assert cache.size < len(text) + 100
+    chain.select('near', lambda header: (header['records']['expiryDates'][:1], header['records']['strikePrices'][:2]))
+    selected = cache.size
+    assert selected > len(text)
+    chain.state
+    assert cache.size > selected + len(text) // 2
+    assert cache.stats['evictions'] == 1
+    assert cache.get_or_fetch('index_option_chain', lambda: None) is chain
+
+
+def test_cached_payloads_are_shared_and_left_unchanged():
+    bench = nbnbench.NBNBench()
+    state = bench.synthetic_chain(20, 3, now=bench.payload_time)
+    expected = copy.deepcopy(state)
+    client = nbnbench.StaticClient(state)
+    client.index_option_chain_raw = None
+    nbn = nbnmain.NiftyBankNifty(client=client)
+    nbn.output_format = 'none'
+    assert nbn.opt_chain(-1) is nbn.fetch('index_option_chain') is state
+    nbn.opt_chain(5)
+    nbn.get_all_expiry()
+    nbn.chain_greeks()
+    nbn.chain_analytics()
+    nbn.top_fno()
+    assert state == expected
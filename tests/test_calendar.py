@@ -0,0 +1,49 @@
+import calendar
+from datetime import date, datetime
+import nbncalendar
+import nbndetails
+import nbngreeks
+
+
+def test_weekly_expiry_on_a_holiday_moves_to_the_previous_trading_day():
+    calendar = nbncalendar.default_calendar()
+    # Thursday 11-Apr-2024 was Id-Ul-Fitr
+    assert date(2024, 4, 11) in calendar.holidays
+    assert calendar.next_weekly(date(2024, 4, 8)) == date(2024, 4, 10)
+
+
+def test_monthly_expiry_on_a_holiday_moves_to_the_previous_trading_day():
+    # Thursday 30-Mar-2023 was Ram Navami
+    assert nbncalendar.default_calendar().next_monthly(date(2023, 3, 1)) == date(2023, 3, 29)
+
+
+def test_index_expiries_move_to_tuesday_in_september_2025():
+    calendar = nbncalendar.default_calendar()
+    assert calendar.next_weekly(date(2025, 8, 25)) == date(2025, 8, 28)
+    assert calendar.next_weekly(date(2025, 8, 29)) == date(2025, 9, 2)
+    assert calendar.next_monthly(date(2025, 8, 1)) == date(2025, 8, 28)
+    assert calendar.next_monthly(date(2025, 9, 1)) == date(2025, 9, 30)
+    assert calendar.time_to_next_expiry(datetime(2025, 9, 2, 16, 0)) > calendar.time_to_expiry(date(2025, 9, 8), datetime(2025, 9, 2, 16, 0))
+
+
+def test_weekday_schedule_per_symbol(monkeypatch):
+    monkeypatch.setitem(nbncalendar.symbol_weekdays, 'MONDAYS', {date.min: calendar.MONDAY})
+    assert nbncalendar.default_calendar('MONDAYS').next_weekly(date(2025, 9, 3)) == date(2025, 9, 8)
+    assert nbncalendar.ExpiryCalendar(2025, 2025, weekday=calendar.THURSDAY).next_weekly(date(2025, 9, 3)) == date(2025, 9, 4)
+
+
+def test_calendar_is_shared():
+    assert nbndetails.NBNDetails.calendar is nbngreeks.NBNGreeks.calendar is nbncalendar.default_calendar()
+
+
+def test_refresh_merges_the_nse_list(tmp_path):
+    path = tmp_path / 'holidays.json'
+    path.write_text('{"FO": [{"tradingDate": "26-Jan-2023", "weekDay": "Thursday", "description": "Republic Day"}]}')
+
+    class Client:
+        def holiday_list(self):
+            return {'CM': [], 'FO': [{'tradingDate': '15-Aug-2024', 'weekDay': 'Thursday', 'description': 'Independence Day', 'Sr_no': 1}]}
+
+    holidays = nbncalendar.refresh_holidays(Client(), str(path))
+    assert holidays == [date(2023, 1, 26), date(2024, 8, 15)]
+    assert nbncalendar.read_holidays(str(path)) == holidays
@@ -0,0 +1,82 @@
+import json
+import nbnbench
+import nbnclient
+import nbnmain
+
+
+class Response:
+
+    def __init__(self, value):
+        self.status_code = 200
+        self.content = json.dumps(value).encode('utf8')
+
+    def raise_for_status(self):
+        pass
+
+
+class Session:
+    '''answers the option chain routes of NSELive._routes and remembers the requests'''
+
+    def __init__(self, chain):
+        self.chain = chain
+        self.requests = []
+
+    def get(self, url, params=None, timeout=None):
+        self.requests.append((url, dict(params or {})))
+        if url.endswith(nbnclient.NBNClient._routes['option_chain_contract_info']):
+            return Response({'expiryDates': self.chain['records']['expiryDates']})
+        if url.endswith(nbnclient.NBNClient._routes['option_chain_v3']):
+            return Response(self.chain)
+        raise AssertionError(f'unexpected request {url}')
+
+
+def stub_client(chain):
+    """returns an NBNClient with the jugaad_data routes answered by Session, without negotiating cookies"""
+    client = nbnclient.NBNClient.__new__(nbnclient.NBNClient)
+    client.s = Session(chain)
+    return client
+
+
+def chain():
+    bench = nbnbench.NBNBench()
+    return bench.synthetic_chain(20, 3, now=bench.payload_time)
+
+
+def test_raw_option_chain_makes_the_index_option_chain_request():
+    client = stub_client(chain())
+    client.index_option_chain('BANKNIFTY')
+    decoded = client.s.requests
+    client.s.requests = []
+    client.index_option_chain_raw('BANKNIFTY')
+    assert client.s.requests == decoded
+    url, params = decoded[-1]
+    assert url == client.base_url + client._routes['option_chain_v3']
+    assert params == {'type': 'Indices', 'symbol': 'BANKNIFTY', 'expiry': client.s.chain['records']['expiryDates'][0]}
+
+
+def test_raw_option_chain_without_a_route_falls_back_to_the_decoded_one():
+    state = chain()
+    client = stub_client(state)
+    client._routes = {}
+    client.index_option_chain = lambda symbol=None: state
+    assert client.index_option_chain_raw() is None
+    nbn = nbnmain.NiftyBankNifty(client=client)
+    nbn.output_format = 'none'
+    assert nbn.fetch('index_option_chain') is state
+
+
+def test_raw_option_chain_is_fetched_and_decoded_once_per_response():
+    state = chain()
+    raw = nbnmain.NiftyBankNifty(client=stub_client(state))
+    raw.output_format = 'none'
+    decoded = nbnmain.NiftyBankNifty(client=nbnbench.StaticClient(state))
+    decoded.output_format = 'none'
+    decoded.get_client().index_option_chain_raw = None
+    rows = raw.opt_chain(5)
+    assert rows == decoded.opt_chain(5)
+    assert raw.get_all_expiry() == state['records']['expiryDates']
+    cached = raw.fetch_cached('index_option_chain')
+    assert cached.layout() is not None and cached.decoded is None
+    assert raw.fetch('index_option_chain') == state
+    chains = [request for request in raw.get_client().s.requests if request[0].endswith('/option-chain-v3')]
+    assert len(chains) == 1
@@ -0,0 +1,79 @@
+from datetime import timedelta
+import numpy
+import nbnbench
+import nbngreeks
+
+
+def make_chain(strikes=20, expiries=3):
+    bench = nbnbench.NBNBench()
+    return bench, bench.synthetic_chain(strikes, expiries, now=bench.payload_time)
+
+
+def assert_close(result, expected, tolerance):
+    for leg in ('CE', 'PE'):
+        for name in nbngreeks.GreeksCache.names:
+            assert numpy.allclose(result[leg][name], expected[leg][name], atol=tolerance, equal_nan=True), (leg, name)
+
+
+def test_changed_rows_are_recomputed_and_others_reused():
+    bench, chain = make_chain()
+    greeks = nbngreeks.NBNGreeks()
+    cache = nbngreeks.GreeksCache(bench.roi, greeks=greeks)
+    now = bench.payload_time
+    cache.update(chain, 'NIFTY', now)
+    rows = chain['records']['data']
+    rows[5]['CE']['impliedVolatility'] += 3
+    rows[7]['PE']['impliedVolatility'] += 3
+    result = cache.update(chain, 'NIFTY', now)
+    assert cache.stats['recomputed'] == 4
+    assert cache.stats['reused'] == 2 * len(rows) - 4
+    assert_close(result, greeks.option_chain_greeks(chain, bench.roi, now), 0)
+
+
+def test_reused_rows_stay_within_the_documented_drift():
+    bench, chain = make_chain()
+    greeks = nbngreeks.NBNGreeks()
+    cache = nbngreeks.GreeksCache(bench.roi, greeks=greeks)
+    cache.update(chain, 'NIFTY', bench.payload_time)
+    now = bench.payload_time + timedelta(seconds=59)
+    chain['records']['underlyingValue'] *= 1.0002
+    # the drift documented on GreeksCache
+    assert_close(cache.update(chain, 'NIFTY', now), greeks.option_chain_greeks(chain, bench.roi, now), 0.15 + 1e-9)
+    assert cache.stats['recomputed'] == 0 and cache.stats['refreshed'] == 0
+
+
+def test_spot_moves_refresh_every_row_from_the_kept_terms():
+    bench, chain = make_chain()
+    greeks = nbngreeks.NBNGreeks()
+    cache = nbngreeks.GreeksCache(bench.roi, greeks=greeks)
+    cache.update(chain, 'NIFTY', bench.payload_time)
+    rows = chain['records']['data']
+    rows[3]['CE']['impliedVolatility'] += 2
+    chain['records']['underlyingValue'] *= 1.01
+    result = cache.update(chain, 'NIFTY', bench.payload_time + timedelta(seconds=30))
+    assert cache.stats == {'snapshots': 2, 'added': 2 * len(rows), 'reused': 0,
+                           'refreshed': 2 * len(rows) - 2, 'recomputed': 2}
+    # rows are computed at the time of the last full computation
+    assert_close(result, greeks.option_chain_greeks(chain, bench.roi, bench.payload_time), 0)
+
+
+def test_full_recompute_when_rows_or_time_move():
+    bench, chain = make_chain()
+    greeks = nbngreeks.NBNGreeks()
+    cache = nbngreeks.GreeksCache(bench.roi, greeks=greeks)
+    cache.update(chain, 'NIFTY', bench.payload_time)
+    del chain['records']['data'][0]
+    cache.update(chain, 'NIFTY', bench.payload_time)
+    legs = 2 * len(chain['records']['data'])
+    assert cache.stats['reused'] == 0 and cache.stats['recomputed'] == legs
+    now = bench.payload_time + timedelta(minutes=5)
+    assert_close(cache.update(chain, 'NIFTY', now), greeks.option_chain_greeks(chain, bench.roi, now), 0)
+    assert cache.stats['reused'] == 0 and cache.stats['recomputed'] == 2 * legs
+
+
+def test_only_the_latest_snapshots_are_kept():
+    bench, chain = make_chain(5, 1)
+    cache = nbngreeks.GreeksCache(bench.roi, max_symbols=2)
+    for symbol in ('A', 'B', 'C'):
+        cache.update(chain, symbol, bench.payload_time)
+    assert list(cache.snapshots) == ['B', 'C']
@@ -0,0 +1,28 @@
+import nbnbench
+import nbnmain
+
+
+class SymbolClient(nbnbench.StaticClient):
+    '''answers every symbol with its own chain and remembers the symbols asked for'''
+
+    def __init__(self, chains):
+        super().__init__(chains['NIFTY'])
+        self.chains = chains
+        self.asked = []
+
+    def index_option_chain(self, symbol=None):
+        self.asked.append(symbol)
+        return self.chains[symbol or 'NIFTY']
+
+    index_option_chain_raw = None
+
+
+def test_watch_chain_follows_the_symbol():
+    bench = nbnbench.NBNBench()
+    chains = {'NIFTY': bench.synthetic_chain(10, 2, 17500, now=bench.payload_time),
+              'BANKNIFTY': bench.synthetic_chain(10, 2, 40000, 100, now=bench.payload_time)}
+    client = SymbolClient(chains)
+    nbn = nbnmain.NiftyBankNifty(client=client)
+    diff = next(nbn.watch_chain(0, 1, 'BANKNIFTY'))
+    assert client.asked == ['BANKNIFTY']
+    assert diff['summary']['underlyingValue'] == 40000
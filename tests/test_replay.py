@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+import nbnbench
+import nbnmain
+import nbnreplay
+import nbnstore
+
+
+def test_days_recorded_for_another_symbol_only_are_replayed(tmp_path):
+    bench = nbnbench.NBNBench()
+    chain = bench.synthetic_chain(10, 2, 40000, 100, now=bench.payload_time)
+    store = nbnstore.SegmentStore(str(tmp_path))
+    start = datetime(2023, 4, 3, 10, 0)
+    for minute in range(3):
+        store.append('index_option_chain.BANKNIFTY', chain, start + timedelta(minutes=minute))
+    replay = nbnreplay.NBNReplay(str(tmp_path))
+    assert replay.days() == [start.date()]
+    result = replay.run_day(start.date(), lambda nbn, now: nbn.opt_chain(2, symbol='BANKNIFTY') and now)
+    assert result['ticks'] == 3 and len(result['results']) == 3
+
+
+def test_none_output_format_only_returns_the_data(capsys):
+    nbn = nbnmain.NiftyBankNifty(client=nbnbench.StaticClient({}))
+    nbn.output_format = 'none'
+    nbn.output_data({'a': 1})
+    assert capsys.readouterr().out == ''
@@ -0,0 +1,25 @@
+from datetime import datetime
+import nbnbench
+import nbnmain
+import nbnseries
+from test_main import SymbolClient
+
+
+def test_underlyings_sharing_an_expiry_keep_their_own_series(tmp_path):
+    bench = nbnbench.NBNBench()
+    chains = {'NIFTY': bench.synthetic_chain(10, 2, 17500, now=bench.payload_time),
+              'BANKNIFTY': bench.synthetic_chain(10, 2, 40000, 100, now=bench.payload_time)}
+    nbn = nbnmain.NiftyBankNifty(client=SymbolClient(chains))
+    nbn.output_format = 'none'
+    nbn.series_store = nbnseries.NBNSeries(str(tmp_path))
+    nbn.opt_chain(5)
+    nbn.opt_chain(5, symbol='BANKNIFTY')
+    when = datetime.strptime(chains['NIFTY']['records']['timestamp'], '%d-%b-%Y %H:%M:%S')
+    expiry = chains['NIFTY']['records']['expiryDates'][0]
+    assert expiry == chains['BANKNIFTY']['records']['expiryDates'][0]
+    nifty = nbn.series_store.open(when.date(), expiry)
+    banknifty = nbn.series_store.open(when.date(), expiry, 'BANKNIFTY')
+    slot = nifty.slot(when)
+    assert nifty.underlying[slot] == 17500 and banknifty.underlying[slot] == 40000
+    assert min(banknifty.strikes) > max(nifty.strikes)
+    assert (tmp_path / when.strftime('%Y%m%d') / 'BANKNIFTY' / expiry / 'strikes.json').exists()
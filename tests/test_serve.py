@@ -0,0 +1,61 @@
+import asyncio
+import json
+import nbnbench
+import nbnmain
+import nbnserve
+
+
+def request(server, path):
+    """returns the status and decoded body of a GET on a started server"""
+    async def get():
+        await server.start()
+        try:
+            reader, writer = await asyncio.open_connection(server.host, server.port)
+            writer.write(f'GET {path} HTTP/1.1\r\nConnection: close\r\n\r\n'.encode('latin-1'))
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        finally:
+            server.server.close()
+            await server.server.wait_closed()
+        head, _, body = response.partition(b'\r\n\r\n')
+        return int(head.split()[1]), json.loads(body)
+    return asyncio.run(get())
+
+
+def make_server():
+    bench = nbnbench.NBNBench()
+    chain = bench.synthetic_chain(20, 3, now=bench.payload_time)
+    nbn = nbnmain.NiftyBankNifty(client=nbnbench.StaticClient(chain))
+    nbn.clock = lambda: bench.payload_time
+    return nbnserve.NBNServer(nbn, port=0)
+
+
+def test_invalid_parameters_are_bad_requests():
+    server = make_server()
+    assert request(server, '/optionChain?limit=ten')[0] == 400
+    assert request(server, '/optionChain?symbol=NOPE')[0] == 400
+    assert request(server, '/topFnO?metrics=openInterest,nope')[0] == 400
+    assert request(server, '/optionChain?limit=500')[0] == 400
+    assert request(server, '/optionChain?limit=0')[0] == 400
+    assert request(server, '/greeks?spot=1')[0] == 400
+    assert request(server, '/greeks?spot=1,2&strike=1,2,3&time=0.1&roi=0.07&sigma=0.2')[0] == 400
+    assert request(server, '/scenario?legs=01-Jan-2000:100:CE:1')[0] == 400
+
+
+def test_valid_request():
+    status, body = request(make_server(), '/optionChain?limit=2')
+    assert status == 200 and len(body) > 0
+    status, body = request(make_server(), '/greeks?spot=17500&strike=17400,17500,17600&time=0.1&roi=0.07&sigma=0.2')
+    assert status == 200 and len(body['call_delta']) == 3
+
+
+def test_internal_errors_are_server_errors():
+    server = make_server()
+
+    def fail(query):
+        return {}['missing']
+
+    server.routes['/fail'] = fail
+    status, body = request(server, '/fail')
+    assert status == 500 and 'KeyError' in body['error']
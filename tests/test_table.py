@@ -0,0 +1,14 @@
+import nbntable
+
+
+def test_expiry_finds_the_rows_of_labels_seen_out_of_date_order():
+    rows = [{'strikePrice': strike, 'expiryDate': expiry, 'CE': {'lastPrice': strike / 100}}
+            for expiry in ('27-Apr-2023', '06-Apr-2023', '13-Apr-2023') for strike in (17600, 17500, 17550)]
+    table = nbntable.ChainTable.from_rows(rows)
+    assert table.column('expiryDate')[::3] == ['06-Apr-2023', '13-Apr-2023', '27-Apr-2023']
+    for expiry in ('06-Apr-2023', '13-Apr-2023', '27-Apr-2023'):
+        part = table.expiry(expiry)
+        assert part.column('expiryDate') == [expiry] * 3
+        assert part.column('strikePrice') == [17500, 17550, 17600]
+    assert table.strikes(17550, 17600, '13-Apr-2023').column('CE', 'lastPrice') == [175.5, 176.0]
+    assert len(table.expiry('20-Apr-2023')) == 0